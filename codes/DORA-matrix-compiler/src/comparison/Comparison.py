@@ -1,13 +1,111 @@
 import json
+import os
+import re
+import zipfile
 
 import geopandas as gpd
 import numpy as np
 import pandas as pd
+from joblib import Parallel, delayed
 from shapely.geometry import Point
 
-from codes.src.comparison.SelectFiles_tools import selectFilesQuery, listFiles, \
-    selectIdsQueryParallelized
-from codes.src.util import dgl_timer, Logger
+from codes.src.matrixStore.TravelTimeMatrixReader import TravelTimeMatrixReader
+from codes.src.matrixStore.TravelTimeMatrixParquet import queryTravelTimeMatrixParquet
+from codes.src.matrixStore.YKRIndex import YKRIndex
+from codes.src.util import dgl_timer, getConfigurationProperties, Logger
+
+SUMMARY_ID_COLUMNS = ["startPoint_YKR_ID", "endPoint_YKR_ID"]
+SUMMARY_TIME_COLUMNS = ["startPoint_EuclideanDistanceWalkingTime", "startPoint_AVGWalkingDistanceWalkingTime",
+                        "endPoint_ParkingTime", "endPoint_AVGWalkingDistanceWalkingTime",
+                        "endPoint_EuclideanDistanceWalkingTime"]
+SUMMARY_OUTPUT_COLUMNS = SUMMARY_ID_COLUMNS + ["costAttribute", "total_travel_time"]
+# Summaries read by each task of "Comparison.calculateTravelTimes"
+SUMMARY_CHUNK_SIZE = 100
+FEATURE_PROPERTIES_PATTERN = re.compile(r'"properties"\s*:\s*')
+
+
+def listTravelTimeSummaries(summariesURL):
+    """
+    :param summariesURL: Folder or zip file with the DORA cost summary geojson files.
+    :return: Sorted list of the geojson file paths (or zip member names).
+    """
+    if zipfile.is_zipfile(summariesURL):
+        with zipfile.ZipFile(summariesURL, 'r') as zip_ref:
+            return sorted(member for member in zip_ref.namelist() if member.endswith(".geojson"))
+
+    summaries = []
+    for root, dirs, files in os.walk(summariesURL):
+        for filename in files:
+            if filename.endswith(".geojson"):
+                summaries.append(os.path.join(root, filename))
+    return sorted(summaries)
+
+
+def readFeatureProperties(text):
+    """
+    :param text: Geojson FeatureCollection of DORA cost summaries.
+    :return: List of the "properties" objects of the features. Only those objects are decoded, the geometries (and
+        the rest of the document) are skipped over as text.
+    """
+    decoder = json.JSONDecoder()
+    properties = []
+    end = 0
+    for match in FEATURE_PROPERTIES_PATTERN.finditer(text):
+        if match.start() < end:
+            # "properties" key inside the properties that were already decoded
+            continue
+        value, end = decoder.raw_decode(text, match.end())
+        # The properties of the "crs" member have no YKR_IDs
+        if isinstance(value, dict) and all(column in value for column in SUMMARY_ID_COLUMNS):
+            properties.append(value)
+    return properties
+
+
+def readTravelTimeSummary(summaryText):
+    """
+    :param summaryText: Geojson text of a cost summary.
+    :return: DataFrame with the SUMMARY_OUTPUT_COLUMNS.
+    """
+    features = readFeatureProperties(summaryText)
+    if len(features) == 0:
+        return pd.DataFrame(columns=SUMMARY_OUTPUT_COLUMNS)
+
+    costAttribute = features[0]["costAttribute"]
+    columns = SUMMARY_ID_COLUMNS + SUMMARY_TIME_COLUMNS + [costAttribute]
+    data = pd.DataFrame.from_records([[properties.get(column) for column in columns]
+                                      for properties in features], columns=columns)
+
+    times = data[SUMMARY_TIME_COLUMNS + [costAttribute]].astype(float)
+
+    summaryDF = data[SUMMARY_ID_COLUMNS].astype(np.int64)
+    summaryDF["costAttribute"] = costAttribute
+    summaryDF["total_travel_time"] = times.values.sum(axis=1)
+    return summaryDF
+
+
+def readTravelTimeSummaries(summariesURL, summaries):
+    """
+    Worker of "Comparison.calculateTravelTimes". The zip file is opened once for the whole chunk of summaries, and
+    only the properties needed by the total travel time are decoded.
+
+    :param summariesURL: Folder or zip file of the summaries.
+    :param summaries: Chunk of geojson file paths or zip member names.
+    :return: DataFrame with the SUMMARY_OUTPUT_COLUMNS of all the summaries of the chunk.
+    """
+    summaryDFs = []
+    if zipfile.is_zipfile(summariesURL):
+        with zipfile.ZipFile(summariesURL, 'r') as zip_ref:
+            for summary in summaries:
+                summaryDFs.append(readTravelTimeSummary(zip_ref.read(summary).decode("utf-8")))
+    else:
+        for summary in summaries:
+            with open(summary, encoding="utf-8") as summaryFile:
+                summaryDFs.append(readTravelTimeSummary(summaryFile.read()))
+
+    summaryDFs = [summaryDF for summaryDF in summaryDFs if len(summaryDF) > 0]
+    if not summaryDFs:
+        return pd.DataFrame(columns=SUMMARY_OUTPUT_COLUMNS)
+    return pd.concat(summaryDFs, ignore_index=True)
 
 
 class Comparison(object):
@@ -41,18 +139,19 @@ class Comparison(object):
         return points
 
     def loadTravelTimeMatrixDataFrameSubset(self, travelTimeMatrixURL, originGridCellsURL, destinationGridCellsURL,
-                                            gridID="ID"):
+                                            gridID="ID", ykrIndex=None, columns=None):
         originGridCellsDataFrame = gpd.GeoDataFrame.from_file(originGridCellsURL)
         destinationGridCellsDataFrame = gpd.GeoDataFrame.from_file(destinationGridCellsURL)
         origIDs = originGridCellsDataFrame[gridID].values
         destIDs = destinationGridCellsDataFrame[gridID].values
 
-        files = listFiles(travelTimeMatrixURL)
+        if ykrIndex is None:
+            ykrIndex = YKRIndex.build(matrixFolder=travelTimeMatrixURL)
         # Select files to chosen destinations
-        destFiles = selectFilesQuery(files, destIDs)
+        destFiles = ykrIndex.getFiles(destIDs)
 
-        # Search chosen origin YKR-IDs within the selected files
-        selection = selectIdsQueryParallelized(self, destFiles, origIDs, searchColumn="from_id", sep=";")
+        # Search chosen origin YKR-IDs within the selected files, reading only the requested columns
+        selection = TravelTimeMatrixReader(origIDs, columns=columns, sep=";").readFiles(destFiles)
         # selection = selectIdsQuery(destFiles, origIDs, searchColumn="from_id", sep=";")
 
         # Save selection to disk
@@ -61,6 +160,20 @@ class Comparison(object):
 
         return selection
 
+    def loadTravelTimeMatrixParquetSubset(self, datasetFolder, originIDs=None, destinationIDs=None, columns=None):
+        """
+        Read the travel times between the given origins and destinations from the Parquet dataset compiled with
+        "compileTravelTimeMatrixParquet". The destinations select the partitions and the "from_id" statistics skip the
+        row groups of the other origins, nothing is parsed from text.
+
+        :param datasetFolder: Folder of the Parquet dataset.
+        :param originIDs: Origin YKR_IDs, by default every origin.
+        :param destinationIDs: Destination YKR_IDs, by default every destination.
+        :param columns: Value columns to read, by default all of them.
+        :return: DataFrame with "from_id", "to_id" and the requested columns.
+        """
+        return queryTravelTimeMatrixParquet(datasetFolder, fromIds=originIDs, toIds=destinationIDs, columns=columns)
+
     def mergeMetropAccessData(self, travelTimeMatrixURL, carRoutingCostSummaryURL):
         travelTimeSubset = pd.read_csv(travelTimeMatrixURL, sep=";")
         costSummaryDF = gpd.GeoDataFrame.from_file(carRoutingCostSummaryURL)
@@ -97,6 +210,68 @@ class Comparison(object):
 
         return travelTimeSummaryDF
 
+    @dgl_timer
+    def calculateTravelTimes(self, summariesURL, outputURL, jobs=None, chunkSize=SUMMARY_CHUNK_SIZE):
+        """
+        Batch version of "calculateTravelTime": compute the total travel time of every cost summary of a folder or zip
+        file with a process pool, and write all of them into one file.
+
+        :param summariesURL: Folder or zip file with the DORA cost summary geojson files.
+        :param outputURL: Output file, written as Parquet if it ends with ".parquet" (requires pyarrow) and as CSV
+            separated by ";" otherwise, which can be uploaded as it is with the ATTRIBUTES_MAPPING configuration.
+        :param jobs: Number of worker processes, by default "jobs" in the PARALLELIZATION configuration.
+        :param chunkSize: Number of summaries read by each task.
+        :return: Number of written rows.
+        """
+        config = getConfigurationProperties(section="PARALLELIZATION")
+        jobs = int(jobs if jobs is not None else config["jobs"])
+
+        summaries = listTravelTimeSummaries(summariesURL)
+        Logger.getInstance().info("Calculating the total travel time of %s summaries with %s workers"
+                                  % (len(summaries), jobs))
+
+        outputFolder = os.path.dirname(outputURL)
+        if outputFolder and not os.path.exists(outputFolder):
+            os.makedirs(outputFolder)
+
+        if outputURL.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            csvFile = None
+        else:
+            csvFile = open(outputURL, 'w+', newline="")
+            csvFile.write(";".join(SUMMARY_OUTPUT_COLUMNS) + "\n")
+
+        parquetWriter = None
+        rows = 0
+        try:
+            with Parallel(n_jobs=jobs, backend="loky", verbose=int(config["verbose"]),
+                          return_as="generator") as parallel:
+                summaryDFs = parallel(delayed(readTravelTimeSummaries)(summariesURL, summaries[start:start + chunkSize])
+                                      for start in range(0, len(summaries), chunkSize))
+
+                for summaryDF in summaryDFs:
+                    if len(summaryDF) == 0:
+                        continue
+
+                    if csvFile is not None:
+                        summaryDF.to_csv(csvFile, sep=";", header=False, index=False)
+                    else:
+                        table = pa.Table.from_pandas(summaryDF, preserve_index=False)
+                        if parquetWriter is None:
+                            parquetWriter = pq.ParquetWriter(outputURL, table.schema)
+                        parquetWriter.write_table(table)
+
+                    rows += len(summaryDF)
+        finally:
+            if csvFile is not None:
+                csvFile.close()
+            if parquetWriter is not None:
+                parquetWriter.close()
+
+        Logger.getInstance().info("%s rows written to %s" % (rows, outputURL))
+        return rows
+
     def calculateDifferenceBetweenOldAndNewTravelTimes(self, travelTimeSummaryURL):
         travelTimeSummaryDF = self.calculateTravelTime(travelTimeSummaryURL=travelTimeSummaryURL)
         if len(travelTimeSummaryDF["costAttribute"]) > 0:
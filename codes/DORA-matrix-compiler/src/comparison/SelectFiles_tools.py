@@ -1,10 +1,12 @@
 from joblib import delayed, Parallel
 
+from codes.src.matrixStore.MatrixArchive import MatrixArchive
 from codes.src.util import getConfigurationProperties
 
 __author__ = 'hentenka'
 
-import os, sys, random, shutil
+import io, os, sys, random, shutil
+import numpy as np
 import pandas as pd
 
 prefix_file = 'travel_times_to_ '
@@ -23,48 +25,65 @@ def listFiles(topPath):
 
 def selectFilesQuery(inputFilesList, inputIDs):
     ''' Searches files based on inputIDs (YKR-ID) from the "inputFilesList" '''
+    filesByBasename = {}
+    for file in inputFilesList:
+        filesByBasename.setdefault(os.path.basename(file), file)
+
     selected = []
     for id in inputIDs:
         q = prefix_file + str(id) + '.txt'
-        for file in inputFilesList:
-            basename = os.path.basename(file)
-            if q in basename:
-                selected.append(file)
-                break
+        if q in filesByBasename:
+            selected.append(filesByBasename[q])
     return selected
 
 
 def selectIdsQuery(inputFilesList, searchIDs, searchColumn, sep):
     ''' Searches YKR-IDs from files based on inputIDs (YKR-ID) from the "inputFilesList" and returns a pandas DataFrame from the results '''
-    selectedData = pd.DataFrame()
-    for file in inputFilesList:
-        data = pd.read_csv(file, sep=sep)
-        selection = data[data[searchColumn].isin(searchIDs)]
-        selectedData = selectedData.append(selection)
-    return selectedData
+    selections = [readSelectedData(file, searchColumn, searchIDs, sep) for file in inputFilesList]
+    return concatSelectedData(selections)
 
 
-def selectIdsQueryParallelized(self, inputFilesList, searchIDs, searchColumn, sep):
-    ''' Searches YKR-IDs from files based on inputIDs (YKR-ID) from the "inputFilesList" and returns a pandas DataFrame from the results '''
-    self.selectedData = pd.DataFrame()
+def selectIdsQueryParallelized(inputFilesList, searchIDs, searchColumn, sep, usecols=None, dtype=None, backend=None):
+    ''' Searches YKR-IDs from files based on inputIDs (YKR-ID) from the "inputFilesList" and returns a pandas DataFrame from the results.
+
+    Each worker returns the selection of its file and the selections are concatenated once at the end, in the order
+    of "inputFilesList". "usecols" and "dtype" are passed to "read_csv", and "backend" ("threading" or "loky") is by
+    default "select_backend" in the PARALLELIZATION configuration. '''
+    config = getConfigurationProperties(section="PARALLELIZATION")
+    searchIDs = np.unique(np.asarray(searchIDs))
+
+    with Parallel(n_jobs=int(config["jobs"]),
+                  backend=backend if backend is not None else config.get("select_backend", "threading"),
+                  verbose=int(config["verbose"])) as parallel:
+        selections = parallel(delayed(readSelectedData)(file, searchColumn, searchIDs, sep, usecols, dtype)
+                              for file in inputFilesList)
+
+    return concatSelectedData(selections)
+
+
+def readSelectedData(file, searchColumn, searchIDs, sep, usecols=None, dtype=None):
+    ''' Reads the rows of "file" whose "searchColumn" value is one of "searchIDs" '''
+    if usecols is not None and searchColumn not in usecols:
+        usecols = [searchColumn] + list(usecols)
+    data = pd.read_csv(file, sep=sep, usecols=usecols, dtype=dtype)
+    return data[data[searchColumn].isin(searchIDs)]
+
 
-    with Parallel(n_jobs=getConfigurationProperties(section="PARALLELIZATION")["jobs"],
-                  backend="threading",
-                  verbose=getConfigurationProperties(section="PARALLELIZATION")["verbose"]) as parallel:
-        # while len(verticesID) <= len(geojson["features"]):
-        returns = parallel(delayed(appendSelectedData)(self, file, searchColumn, searchIDs, sep)
-                           for file in inputFilesList)
+def selectIdsQueryArchive(archivePath, destIDs, searchIDs, searchColumn, sep, usecols=None, dtype=None):
+    ''' Searches YKR-IDs from the destination blocks of a matrix archive (see MatrixArchive) based on inputIDs (YKR-ID) and returns a pandas DataFrame from the results.
 
-    data = self.selectedData
-    self.selectedData = None
-    return data
+    Only the blocks of "destIDs" are read and decompressed, the destinations missing from the archive are skipped. '''
+    archive = MatrixArchive(archivePath)
+    selections = [readSelectedData(io.BytesIO(archive.readBytes(destID)), searchColumn, searchIDs, sep, usecols, dtype)
+                  for destID in destIDs if destID in archive]
+    return concatSelectedData(selections)
 
 
-def appendSelectedData(self, file, searchColumn, searchIDs, sep):
-    data = pd.read_csv(file, sep=sep)
-    selection = data[data[searchColumn].isin(searchIDs)]
-    self.selectedData = self.selectedData.append(selection)
-    return self.selectedData
+def concatSelectedData(selections):
+    selections = [selection for selection in selections if len(selection) > 0]
+    if not selections:
+        return pd.DataFrame()
+    return pd.concat(selections, ignore_index=True)
 
 
 def selectRandom(inputList, sampleSize):
@@ -1,60 +1,87 @@
+import io
 import json
+import os
+import threading
 
 import geopandas as gpd
-import psycopg2
-from joblib import Parallel, delayed
+import pandas as pd
 from psycopg2.extensions import register_adapter
+from shapely import wkb
 from shapely.geometry import LineString, Point, Polygon
 from sqlalchemy import create_engine, MetaData, Table
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 
 from codes.src.util import getConfigurationProperties, extractCRSFromDataframe, GPD_CRS, GeometryType, dgl_timer
 from codes.src.geometries.adapters import Adapters
 
 
-def verifyPairOfPointsExistence(self, ykr_from_id, ykr_to_id, sql):
-    geoDataFrame = self.executePostgisQuery(sql % (ykr_from_id, ykr_to_id))
-    if len(geoDataFrame) > 0:
-        self.travelTimeMatrixCopy = self.travelTimeMatrixCopy[
-            ~(
-                (self.travelTimeMatrixCopy.ykr_from_id == ykr_from_id) &
-                (self.travelTimeMatrixCopy.ykr_to_id == ykr_to_id)
-            )
-        ]
-    return self.travelTimeMatrixCopy
-
-
 class PostGISServiceProvider(object):
     # engine = create_engine('postgresql://<yourUserName>:postgres@localhost:5432/postgres', echo=False)
     # Session = sessionmaker(bind=engine)
     # session = Session()
     # meta = MetaData(engine, schema='cldmatchup')
+    __sharedEngine = None
+    __sharedEnginePid = None
+    __engineLock = threading.Lock()
+
     def __init__(self):
         self.__engine = None
 
     def getConnection(self):
         """
-        Creates a new connection to the pg_database
+        Borrow a connection from the pool of the shared engine. Closing the connection returns it to the pool.
 
-        :return: New connection.
+        :return: Pooled psycopg2 connection.
         """
-        config = getConfigurationProperties(section="DATABASE_CONFIG")
-        con = psycopg2.connect(database=config["database_name"], user=config["user"], password=config["password"],
-                               host=config["host"])
-        return con
+        return self.getEngine().raw_connection()
 
     def getEngine(self):
+        """
+        The engine, and its connection pool, is created once per process and shared by every PostGISServiceProvider.
+        The pool keeps "pool_min_size" connections open, opens up to "pool_max_size" connections under load and
+        checks that a connection is alive before lending it.
+
+        :return: Shared SQLAlchemy engine.
+        """
         if not self.__engine:
-            config = getConfigurationProperties(section="DATABASE_CONFIG")
-            # engine = create_engine('postgresql://<yourUserName>:postgres@localhost:5432/postgres', echo=False)
-            self.__engine = create_engine(
-                'postgresql://%s:%s@%s/%s' % (
-                    config["user"], config["password"], config["host"], config["database_name"]),
-                echo=False
-            )
+            self.__engine = PostGISServiceProvider.getSharedEngine()
 
         return self.__engine
 
+    @staticmethod
+    def getSharedEngine():
+        with PostGISServiceProvider.__engineLock:
+            if PostGISServiceProvider.__sharedEnginePid != os.getpid():
+                config = getConfigurationProperties(section="DATABASE_CONFIG")
+                minSize = int(config["pool_min_size"])
+                maxSize = int(config["pool_max_size"])
+                # engine = create_engine('postgresql://<yourUserName>:postgres@localhost:5432/postgres', echo=False)
+                PostGISServiceProvider.__sharedEngine = create_engine(
+                    'postgresql+psycopg2://%s:%s@%s:%s/%s' % (
+                        config["user"], config["password"], config["host"], config["port"], config["database_name"]),
+                    echo=False,
+                    poolclass=QueuePool,
+                    pool_size=minSize,
+                    max_overflow=max(maxSize - minSize, 0),
+                    pool_pre_ping=True
+                )
+                PostGISServiceProvider.__sharedEnginePid = os.getpid()
+
+            return PostGISServiceProvider.__sharedEngine
+
+    @staticmethod
+    def disposeConnectionPool():
+        """
+        Close every pooled connection, the next connection request creates a new pool.
+        """
+        with PostGISServiceProvider.__engineLock:
+            if PostGISServiceProvider.__sharedEngine is not None \
+                    and PostGISServiceProvider.__sharedEnginePid == os.getpid():
+                PostGISServiceProvider.__sharedEngine.dispose()
+            PostGISServiceProvider.__sharedEngine = None
+            PostGISServiceProvider.__sharedEnginePid = None
+
     def executePostgisQuery(self, sql):
         """
         Given a PG_SQL execute the query and retrieve the attributes and its respective geometries.
@@ -72,25 +99,50 @@ class PostGISServiceProvider(object):
 
         return geoDataFrame
 
+    @dgl_timer
     def insertableTravelTimeMatrixGeoDataFrame(self, travelTimeMatrix, tableName, column1, column2):
+        """
+        Remove the rows whose (column1, column2) pair is already stored in the table.
 
-        sql = "select * from %s where %s = %s and %s = %s" % (tableName, column1, "%s", column2, "%s")
+        The pairs are copied into a temporary table and anti-joined with the table on the server, so the whole
+        travel time matrix is checked with one COPY and one query.
 
-        self.travelTimeMatrixCopy = travelTimeMatrix.copy()
+        :param travelTimeMatrix: (Geo)DataFrame to be inserted.
+        :param tableName: Table where the rows would be inserted.
+        :param column1: First column of the pair (e.g. "ykr_from_id").
+        :param column2: Second column of the pair (e.g. "ykr_to_id").
+        :return: The rows of the travel time matrix that are not in the table.
+        """
+        pairs = travelTimeMatrix[[column1, column2]].drop_duplicates()
+        csvData = io.StringIO()
+        pairs.to_csv(csvData, sep=';', header=False, index=False)
+        csvData.seek(0)
 
-        ################################################################################################################
-        # for index, row in travelTimeMatrix.iterrows():
-        #     travelTimeMatrixCopy = verifyPairOfPointsExistence(row, sql, travelTimeMatrixCopy)
-        ################################################################################################################
+        sql = "SELECT pairs.%s, pairs.%s " \
+              "FROM insertable_pairs AS pairs " \
+              "WHERE NOT EXISTS (" \
+              "SELECT 1 FROM %s AS matrix WHERE matrix.%s = pairs.%s AND matrix.%s = pairs.%s" \
+              ")" % (column1, column2, tableName, column1, column1, column2, column2)
 
-        with Parallel(n_jobs=int(getConfigurationProperties(section="PARALLELIZATION")["jobs"]),
-                      backend="threading",
-                      verbose=int(getConfigurationProperties(section="PARALLELIZATION")["verbose"])) as parallel:
-            returns = parallel(
-                delayed(verifyPairOfPointsExistence)(self, row[column1], row[column2], sql) for index, row in
-                travelTimeMatrix.iterrows())
+        try:
+            connection = self.getConnection()
+            cursor = connection.cursor()
+            cursor.execute("CREATE TEMP TABLE insertable_pairs (%s double precision, %s double precision) "
+                           "ON COMMIT DROP" % (column1, column2))
+            cursor.copy_expert("COPY insertable_pairs (%s, %s) FROM STDIN WITH DELIMITER ';' NULL ''"
+                               % (column1, column2), csvData)
+            cursor.execute(sql)
+            insertablePairs = cursor.fetchall()
+            connection.commit()
+        except Exception as err:
+            connection.rollback()
+            raise err
+        finally:
+            connection.close()
 
-        return self.travelTimeMatrixCopy
+        travelTimeMatrixPairs = pd.MultiIndex.from_arrays([travelTimeMatrix[column1].astype(float),
+                                                           travelTimeMatrix[column2].astype(float)])
+        return travelTimeMatrix[travelTimeMatrixPairs.isin(insertablePairs)]
 
     @dgl_timer
     def insert(self, dataFrame, tableName, isTableExist="append", geometryType=GeometryType.LINE_STRING):
@@ -150,6 +202,83 @@ class PostGISServiceProvider(object):
 
         return True
 
+    @dgl_timer
+    def copyStream(self, stream, tableName, columns, separator=';', bufferSize=None):
+        """
+        Stream the rows of a readable file-like object into the table with COPY FROM STDIN, without writing them to disk.
+
+        :param stream: Readable (text or binary) file-like object positioned after the header row.
+        :param tableName: Target table name.
+        :param columns: Columns of the target table in the same order than the stream values.
+        :param separator: Values separator.
+        :param bufferSize: Size of the chunks read from the stream, by default the "copy_buffer_size" configuration.
+        :return: True if the statement was executed.
+        """
+        if bufferSize is None:
+            bufferSize = int(getConfigurationProperties(section="DATABASE_CONFIG")["copy_buffer_size"])
+
+        sql = "COPY %s (%s) FROM STDIN WITH DELIMITER '%s' NULL '-1'" % (tableName, ", ".join(columns), separator)
+
+        try:
+            connection = self.getConnection()
+            cursor = connection.cursor()
+            cursor.copy_expert(sql, stream, size=bufferSize)
+            connection.commit()
+        except Exception as err:
+            connection.rollback()
+            raise err
+        finally:
+            connection.close()
+
+        return True
+
+    def executeStatement(self, sql):
+        """
+        Execute and commit a SQL statement that does not return rows (e.g. DDL or INSERT ... SELECT).
+
+        :param sql: SQL sentence.
+        :return: True if the statement was executed.
+        """
+        try:
+            connection = self.getConnection()
+            cursor = connection.cursor()
+            cursor.execute(sql)
+            connection.commit()
+        except Exception as err:
+            connection.rollback()
+            raise err
+        finally:
+            connection.close()
+
+        return True
+
+    def createStagingTable(self, stagingTableName, tableName):
+        """
+        (Re)create an empty UNLOGGED table with the same columns than the given table.
+
+        :param stagingTableName: Staging table name.
+        :param tableName: Table whose columns are copied.
+        :return: True if the statement was executed.
+        """
+        sql = "DROP TABLE IF EXISTS %s; " \
+              "CREATE UNLOGGED TABLE %s (LIKE %s INCLUDING DEFAULTS)" % (stagingTableName, stagingTableName, tableName)
+        return self.executeStatement(sql)
+
+    @dgl_timer
+    def attachStagingTable(self, stagingTableName, tableName, columns):
+        """
+        Append the rows of the staging table into the given table and drop the staging table, in the same transaction.
+
+        :param stagingTableName: Staging table name.
+        :param tableName: Target table name.
+        :param columns: Columns to be appended.
+        :return: True if the statement was executed.
+        """
+        columnNames = ", ".join(columns)
+        sql = "INSERT INTO %s (%s) SELECT %s FROM %s; " \
+              "DROP TABLE %s" % (tableName, columnNames, columnNames, stagingTableName, stagingTableName)
+        return self.executeStatement(sql)
+
     @dgl_timer
     def renameColumnsAndExtractSubSet(self, travelTimeMatrix, columns, geometryColumn="geometry"):
         if columns:
@@ -179,6 +308,179 @@ class PostGISServiceProvider(object):
               "ORDER BY matrix.travel_time ASC " % (tableName, ykrid)
         return self.executePostgisQuery(sql)
 
+    def getTravelTimeMatricesTo(self, ykrids, tableName, chunkSize=None):
+        """
+        Batched version of getTravelTimeMatrixTo, see iterTravelTimeMatrices.
+        """
+        return self.iterTravelTimeMatrices(ykrids, tableName, targetColumn="ykr_to_id",
+                                           geometryColumn="ykr_from_id", chunkSize=chunkSize)
+
+    def getTravelTimeMatricesFrom(self, ykrids, tableName, chunkSize=None):
+        """
+        Batched version of getTravelTimeMatrixFrom, see iterTravelTimeMatrices.
+        """
+        return self.iterTravelTimeMatrices(ykrids, tableName, targetColumn="ykr_from_id",
+                                           geometryColumn="ykr_to_id", chunkSize=chunkSize)
+
+    def iterTravelTimeMatrices(self, ykrids, tableName, targetColumn, geometryColumn, chunkSize=None):
+        """
+        Retrieve the travel time matrices of many targets with one query. The rows are read from a server-side cursor
+        in chunks and each target is yielded as soon as all its rows have been read.
+
+        :param ykrids: Target YKR_IDs.
+        :param tableName: Travel time matrix table name.
+        :param targetColumn: Column filtered by the targets ("ykr_to_id" or "ykr_from_id").
+        :param geometryColumn: Column joined with the grid cells geometry.
+        :param chunkSize: Rows fetched per round-trip, by default "query_chunk_size" in DATABASE_CONFIG.
+        :return: Generator of (YKR_ID, GeoDataFrame) tuples, in ascending YKR_ID order. The targets without travel
+            times are yielded at the end with an empty GeoDataFrame.
+        """
+        if chunkSize is None:
+            chunkSize = int(getConfigurationProperties(section="DATABASE_CONFIG")["query_chunk_size"])
+
+        ykrids = [int(ykrid) for ykrid in ykrids]
+        columns = ["ykr_from_id", "ykr_to_id", "travel_time", "geometry"]
+        targetIndex = columns.index(targetColumn)
+
+        sql = "SELECT matrix.ykr_from_id, matrix.ykr_to_id, matrix.travel_time, grid.geometry " \
+              "FROM %s AS matrix " \
+              "INNER JOIN ykr_gridcells AS grid ON grid.ykr_id = matrix.%s " \
+              "AND matrix.%s = ANY(%%s) " \
+              "ORDER BY matrix.%s ASC, matrix.travel_time ASC " % (tableName, geometryColumn, targetColumn, targetColumn)
+
+        retrievedTargets = set()
+        connection = self.getConnection()
+        try:
+            cursor = connection.cursor(name="travel_time_matrices")
+            cursor.itersize = chunkSize
+            cursor.execute(sql, (ykrids,))
+
+            currentTarget = None
+            rows = []
+            while True:
+                chunk = cursor.fetchmany(chunkSize)
+                if not chunk:
+                    break
+                for row in chunk:
+                    if row[targetIndex] != currentTarget and rows:
+                        retrievedTargets.add(currentTarget)
+                        yield currentTarget, self.createTravelTimeMatrixGeoDataFrame(rows, columns)
+                        rows = []
+                    currentTarget = row[targetIndex]
+                    rows.append(row)
+
+            if rows:
+                retrievedTargets.add(currentTarget)
+                yield currentTarget, self.createTravelTimeMatrixGeoDataFrame(rows, columns)
+
+            cursor.close()
+            connection.commit()
+        finally:
+            connection.close()
+
+        for ykrid in ykrids:
+            if ykrid not in retrievedTargets:
+                retrievedTargets.add(ykrid)
+                yield ykrid, self.createTravelTimeMatrixGeoDataFrame([], columns)
+
+    def createTravelTimeMatrixGeoDataFrame(self, rows, columns):
+        """
+        :param rows: Query result rows whose last value is the hex encoded WKB geometry.
+        :param columns: Column names of the rows, the last one is the geometry column.
+        :return: GeoDataFrame in the same format than executePostgisQuery.
+        """
+        dataFrame = pd.DataFrame([row[:-1] for row in rows], columns=columns[:-1])
+        geometries = [wkb.loads(row[-1], hex=True) for row in rows]
+        return gpd.GeoDataFrame(dataFrame, geometry=geometries, crs=GPD_CRS.PSEUDO_MERCATOR)
+
+    def iterTravelTimeMatrixFeatures(self, ykrids, tableName, targetColumn, geometryColumn, chunkSize=None):
+        """
+        Retrieve the travel time matrices of many targets as GeoJSON features built by PostGIS, so the geometries are
+        never decoded in Python. The features are read from a server-side cursor in chunks.
+
+        :param ykrids: Target YKR_IDs.
+        :param tableName: Travel time matrix table name.
+        :param targetColumn: Column filtered by the targets ("ykr_to_id" or "ykr_from_id").
+        :param geometryColumn: Column joined with the grid cells geometry.
+        :param chunkSize: Rows fetched per round-trip, by default "query_chunk_size" in DATABASE_CONFIG.
+        :return: Generator of (YKR_ID, GeoJSON feature text) tuples, ordered by YKR_ID and travel time.
+        """
+        if chunkSize is None:
+            chunkSize = int(getConfigurationProperties(section="DATABASE_CONFIG")["query_chunk_size"])
+
+        ykrids = [int(ykrid) for ykrid in ykrids]
+
+        sql = "SELECT matrix.%s, json_build_object(" \
+              "'geometry', ST_AsGeoJSON(grid.geometry)::json, " \
+              "'id', (row_number() OVER (PARTITION BY matrix.%s ORDER BY matrix.travel_time ASC) - 1)::text, " \
+              "'properties', json_build_object(" \
+              "'travel_time', matrix.travel_time, " \
+              "'ykr_from_id', matrix.ykr_from_id, " \
+              "'ykr_to_id', matrix.ykr_to_id), " \
+              "'type', 'Feature')::text " \
+              "FROM %s AS matrix " \
+              "INNER JOIN ykr_gridcells AS grid ON grid.ykr_id = matrix.%s " \
+              "AND matrix.%s = ANY(%%s) " \
+              "ORDER BY matrix.%s ASC, matrix.travel_time ASC " % (
+                  targetColumn, targetColumn, tableName, geometryColumn, targetColumn, targetColumn)
+
+        connection = self.getConnection()
+        try:
+            cursor = connection.cursor(name="travel_time_matrix_features")
+            cursor.itersize = chunkSize
+            cursor.execute(sql, (ykrids,))
+
+            while True:
+                chunk = cursor.fetchmany(chunkSize)
+                if not chunk:
+                    break
+                for target, feature in chunk:
+                    yield target, feature
+
+            cursor.close()
+            connection.commit()
+        finally:
+            connection.close()
+
+    def iterTravelTimeMatricesFlatGeobuf(self, ykrids, tableName, targetColumn, geometryColumn):
+        """
+        Retrieve the travel time matrix of each target as a FlatGeobuf file built by PostGIS (ST_AsFlatGeobuf,
+        PostGIS >= 3.2).
+
+        :param ykrids: Target YKR_IDs.
+        :param tableName: Travel time matrix table name.
+        :param targetColumn: Column filtered by the targets ("ykr_to_id" or "ykr_from_id").
+        :param geometryColumn: Column joined with the grid cells geometry.
+        :return: Generator of (YKR_ID, FlatGeobuf bytes) tuples in ascending YKR_ID order. The targets without travel
+            times are not yielded.
+        """
+        ykrids = [int(ykrid) for ykrid in ykrids]
+
+        # The rows of each FlatGeobuf are ordered by the aggregate itself, a subquery ORDER BY is not guaranteed to be
+        # kept by the GROUP BY
+        sql = "SELECT features.%s, ST_AsFlatGeobuf(features, true, 'geometry' ORDER BY features.travel_time ASC) " \
+              "FROM (" \
+              "SELECT matrix.ykr_from_id, matrix.ykr_to_id, matrix.travel_time, grid.geometry " \
+              "FROM %s AS matrix " \
+              "INNER JOIN ykr_gridcells AS grid ON grid.ykr_id = matrix.%s " \
+              "AND matrix.%s = ANY(%%s)" \
+              ") AS features " \
+              "GROUP BY features.%s " \
+              "ORDER BY features.%s ASC " % (
+                  targetColumn, tableName, geometryColumn, targetColumn, targetColumn, targetColumn)
+
+        connection = self.getConnection()
+        try:
+            cursor = connection.cursor(name="travel_time_matrices_flatgeobuf")
+            cursor.itersize = 1
+            cursor.execute(sql, (ykrids,))
+            for target, flatGeobuf in cursor:
+                yield target, bytes(flatGeobuf)
+            cursor.close()
+            connection.commit()
+        finally:
+            connection.close()
+
     def getTravelTimeMatrixDifferences(self, ykrid, tableName):
         # sql = "select * from %s where %s = %s" % (tableName, column, ykrid)
         sql = "SELECT matrix.ykr_from_id, matrix.ykr_to_id, matrix.travel_time, matrix.travel_time_difference, grid.geometry " \
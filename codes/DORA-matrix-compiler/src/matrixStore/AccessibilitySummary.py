@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from codes.src.matrixStore.TravelTimeMatrixReader import readValueColumns
+from codes.src.matrixStore.TravelTimeMatrixStore import getColumnDtype, NODATA_VALUE, VALUE_COLUMNS
+from codes.src.util import dgl_timer, getConfigurationProperties, Logger
+
+SUMMARY_QUANTILES = (0.25, 0.75)
+SUMMARY_THRESHOLDS = (15, 30, 45, 60)
+SUMMARY_BLOCK_SIZE = 512
+
+
+def getSummaryColumns(column, quantiles=SUMMARY_QUANTILES, thresholds=SUMMARY_THRESHOLDS):
+    """
+    :param column: Value column name (e.g. "pt_r_t").
+    :return: Names of the statistics of the column, e.g. "pt_r_t_median", "pt_r_t_q25" and "pt_r_t_le30". The
+        threshold counts are only computed for the travel times, not for the distances.
+    """
+    names = ["%s_count" % column, "%s_mean" % column, "%s_median" % column]
+    names += ["%s_q%s" % (column, int(round(quantile * 100))) for quantile in quantiles]
+    if not column.endswith("_d"):
+        names += ["%s_le%s" % (column, threshold) for threshold in thresholds]
+    return names
+
+
+def summarizeValues(column, values, quantiles=SUMMARY_QUANTILES, thresholds=SUMMARY_THRESHOLDS):
+    """
+    Statistics of every row of a block of travel times, the NoData values (-1) are left out like NaN.
+
+    :param column: Value column name of the values.
+    :param values: Array of shape (rows, values).
+    :return: Dictionary of the statistic arrays by the names of "getSummaryColumns".
+    """
+    values = np.array(values, dtype=np.float32)
+    values[values == NODATA_VALUE] = np.nan
+
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=1)
+    hasValues = count > 0
+
+    statistics = {"%s_count" % column: count}
+
+    # The nan-aware reductions warn about the rows without any value, those are computed only for the others
+    mean = np.full(len(values), np.nan)
+    quantileValues = np.full((1 + len(quantiles), len(values)), np.nan)
+    if hasValues.any():
+        mean[hasValues] = np.nanmean(values[hasValues], axis=1)
+        quantileValues[:, hasValues] = np.nanquantile(values[hasValues], [0.5] + list(quantiles), axis=1)
+
+    statistics["%s_mean" % column] = mean
+    statistics["%s_median" % column] = quantileValues[0]
+    for quantile, quantileValue in zip(quantiles, quantileValues[1:]):
+        statistics["%s_q%s" % (column, int(round(quantile * 100)))] = quantileValue
+
+    if not column.endswith("_d"):
+        for threshold in thresholds:
+            statistics["%s_le%s" % (column, threshold)] = (values <= threshold).sum(axis=1)
+    return statistics
+
+
+@dgl_timer
+def summarizeTravelTimeMatrixStore(store, by="to_id", columns=None, quantiles=SUMMARY_QUANTILES,
+                                   thresholds=SUMMARY_THRESHOLDS, blockSize=SUMMARY_BLOCK_SIZE):
+    """
+    Accessibility statistics of every destination ("to_id") or origin ("from_id") of a TravelTimeMatrixStore.
+
+    The column arrays are reduced a block of "blockSize" destinations/origins at a time, so the memory use does not
+    depend on the size of the matrix.
+
+    :param store: TravelTimeMatrixStore.
+    :param by: "to_id" for the statistics of the travel times to each destination, "from_id" for the travel times from
+        each origin.
+    :param columns: Value columns to summarize, by default all the columns of the store.
+    :param quantiles: Quantiles computed besides the median.
+    :param thresholds: Travel times (minutes) for the counts of the values within them.
+    :param blockSize: Number of destinations/origins reduced at a time.
+    :return: DataFrame with the "by" column and the statistics of "getSummaryColumns" of each column.
+    """
+    if by not in ("to_id", "from_id"):
+        raise ValueError("Unknown summary direction: %s" % by)
+    columns = list(columns) if columns is not None else store.columns
+
+    summary = {by: store.ids.astype(np.int32)}
+    for column in columns:
+        array = store.getColumn(column)
+        blocks = []
+        for start in range(0, len(store.ids), blockSize):
+            # Rows of the array are destinations, the origins are its columns
+            values = array[start:start + blockSize] if by == "to_id" else array[:, start:start + blockSize].T
+            blocks.append(summarizeValues(column, values, quantiles, thresholds))
+
+        for name in getSummaryColumns(column, quantiles, thresholds):
+            summary[name] = np.concatenate([block[name] for block in blocks]) if blocks else np.array([])
+
+    return pd.DataFrame(summary)
+
+
+def summarizeMatrixFile(matrixFile, columns=None, quantiles=SUMMARY_QUANTILES, thresholds=SUMMARY_THRESHOLDS,
+                        sep=";"):
+    """
+    Worker of "summarizeTravelTimeMatrixFiles".
+
+    :param matrixFile: "travel_times_to_<YKR_ID>.txt" file.
+    :return: Dictionary with the "to_id" and the statistics of the travel times to the destination.
+    """
+    fileColumns = readValueColumns(matrixFile, columns, sep)
+
+    data = pd.read_csv(matrixFile, sep=sep, usecols=["to_id"] + fileColumns,
+                       dtype={column: getColumnDtype(column) for column in fileColumns})
+    if len(data) == 0:
+        return None
+
+    summary = {"to_id": int(data["to_id"].iloc[0])}
+    for column in fileColumns:
+        statistics = summarizeValues(column, data[column].values[np.newaxis, :], quantiles, thresholds)
+        summary.update({name: statistic[0] for name, statistic in statistics.items()})
+    return summary
+
+
+@dgl_timer
+def summarizeTravelTimeMatrixFiles(files, columns=None, quantiles=SUMMARY_QUANTILES, thresholds=SUMMARY_THRESHOLDS,
+                                   jobs=None, sep=";"):
+    """
+    Accessibility statistics of the destinations of the travel time matrix text files, for when no store has been
+    compiled. The files are summarized one by one by a process pool, so only the files being read are in memory.
+
+    :param files: "travel_times_to_<YKR_ID>.txt" files, e.g. from YKRIndex.getFiles.
+    :param columns: Value columns to summarize, by default all the value columns of each file.
+    :param quantiles: Quantiles computed besides the median.
+    :param thresholds: Travel times (minutes) for the counts of the values within them.
+    :param jobs: Number of worker processes, by default "jobs" in the PARALLELIZATION configuration.
+    :param sep: Separator of the text files.
+    :return: DataFrame with the "to_id" and the statistics of "getSummaryColumns" of each column.
+    """
+    config = getConfigurationProperties(section="PARALLELIZATION")
+    jobs = int(jobs if jobs is not None else config["jobs"])
+
+    Logger.getInstance().info("Summarizing %s travel time matrix files with %s workers" % (len(files), jobs))
+
+    with Parallel(n_jobs=jobs, backend="loky", verbose=int(config["verbose"]), return_as="generator") as parallel:
+        summaries = parallel(delayed(summarizeMatrixFile)(matrixFile, columns, quantiles, thresholds, sep)
+                             for matrixFile in files)
+        summaries = [summary for summary in summaries if summary is not None]
+
+    if columns is None:
+        columns = [column for column in VALUE_COLUMNS
+                   if any("%s_count" % column in summary for summary in summaries)]
+
+    summaryColumns = ["to_id"]
+    for column in columns:
+        summaryColumns += getSummaryColumns(column, quantiles, thresholds)
+    return pd.DataFrame.from_records(summaries, columns=summaryColumns)
+
+
+def joinSummaryToGrid(grid, summary, gridID="YKR_ID", prefix=""):
+    """
+    :param grid: GeoDataFrame of the YKR grid.
+    :param summary: DataFrame from "summarizeTravelTimeMatrixStore" or "summarizeTravelTimeMatrixFiles".
+    :param gridID: YKR_ID column of the grid.
+    :param prefix: Prefix of the statistic columns, e.g. "to_" and "from_" to join both directions to the same grid.
+    :return: The grid with the statistics of its cells, NaN for the cells without travel times.
+    """
+    idColumn = summary.columns[0]
+    summary = summary.rename(columns={name: prefix + name for name in summary.columns[1:]})
+    joined = grid.merge(summary, how="left", left_on=gridID, right_on=idColumn)
+    return joined.drop(columns=idColumn) if idColumn != gridID else joined
@@ -0,0 +1,181 @@
+import io
+import os
+import struct
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from codes.src.matrixStore.YKRIndex import YKRIndex
+from codes.src.util import dgl_timer, Logger
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIVE_MAGIC = b"TTMA"
+ARCHIVE_VERSION = 1
+
+CODEC_ZSTD = 1
+CODEC_ZLIB = 2
+CODEC_NAMES = {CODEC_ZSTD: "zstd", CODEC_ZLIB: "zlib"}
+
+# Header: magic, version, codec. Trailer: footer offset, number of blocks, magic.
+HEADER_FORMAT = "<4sHH"
+TRAILER_FORMAT = "<QQ4s"
+FOOTER_DTYPE = np.dtype([("ykr_id", "<i4"), ("offset", "<i8"), ("length", "<i8")])
+
+
+def getDefaultCodec():
+    """
+    :return: zstd if the "zstandard" package is installed, zlib otherwise.
+    """
+    return CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+
+class MatrixArchiveWriter(object):
+    def __init__(self, archivePath, codec=None, level=None):
+        """
+        Write the travel time matrix into one archive: a compressed block per destination followed by a footer index
+        of the blocks by YKR_ID, so any destination can be read without decompressing the rest.
+
+        :param archivePath: Output archive file.
+        :param codec: CODEC_ZSTD or CODEC_ZLIB, by default zstd when available.
+        :param level: Compression level of the codec.
+        """
+        self.archivePath = archivePath
+        self.codec = codec if codec is not None else getDefaultCodec()
+        if self.codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise ImportError("The zstandard package is required to write zstd archives")
+            self.compressor = zstandard.ZstdCompressor(level=level if level is not None else 10)
+            self.compress = self.compressor.compress
+        else:
+            self.compress = lambda data: zlib.compress(data, level if level is not None else 6)
+
+        self.blocks = []
+        self.file = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open(self):
+        folder = os.path.dirname(self.archivePath)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        self.file = open(self.archivePath, 'wb')
+        self.file.write(struct.pack(HEADER_FORMAT, ARCHIVE_MAGIC, ARCHIVE_VERSION, self.codec))
+
+    def writeBlock(self, ykrId, data):
+        """
+        :param ykrId: Destination YKR_ID.
+        :param data: Bytes of the "travel_times_to_<ykrId>.txt" file.
+        """
+        compressed = self.compress(data)
+        self.blocks.append((ykrId, self.file.tell(), len(compressed)))
+        self.file.write(compressed)
+
+    def close(self):
+        footer = np.array(sorted(self.blocks), dtype=FOOTER_DTYPE)
+        footerOffset = self.file.tell()
+        self.file.write(footer.tobytes())
+        self.file.write(struct.pack(TRAILER_FORMAT, footerOffset, len(footer), ARCHIVE_MAGIC))
+        self.file.close()
+        self.file = None
+
+
+class MatrixArchive(object):
+    def __init__(self, archivePath):
+        """
+        Random access reader of an archive written by MatrixArchiveWriter. Only the footer index is read when the
+        archive is opened, each destination is a seek and the decompression of its own block.
+
+        :param archivePath: Archive file.
+        """
+        self.archivePath = archivePath
+
+        with open(archivePath, 'rb') as f:
+            magic, version, self.codec = struct.unpack(HEADER_FORMAT, f.read(struct.calcsize(HEADER_FORMAT)))
+            if magic != ARCHIVE_MAGIC:
+                raise ValueError("Not a travel time matrix archive: %s" % archivePath)
+            if version != ARCHIVE_VERSION:
+                raise ValueError("Unsupported travel time matrix archive version: %s" % version)
+
+            f.seek(-struct.calcsize(TRAILER_FORMAT), os.SEEK_END)
+            footerOffset, count, magic = struct.unpack(TRAILER_FORMAT, f.read(struct.calcsize(TRAILER_FORMAT)))
+            if magic != ARCHIVE_MAGIC:
+                raise ValueError("Truncated travel time matrix archive: %s" % archivePath)
+
+            f.seek(footerOffset)
+            footer = np.frombuffer(f.read(count * FOOTER_DTYPE.itemsize), dtype=FOOTER_DTYPE)
+
+        if self.codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise ImportError("The zstandard package is required to read zstd archives")
+            self.decompress = zstandard.ZstdDecompressor().decompress
+        else:
+            self.decompress = zlib.decompress
+
+        # The footer is sorted by YKR_ID, so the YKRIndex position of a block is the position of its offset and length
+        self.ykrIndex = YKRIndex.fromIds(footer["ykr_id"])
+        self.ids = self.ykrIndex.ids
+        self.offsets = np.asarray(footer["offset"])
+        self.lengths = np.asarray(footer["length"])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, ykrId):
+        return ykrId in self.ykrIndex
+
+    def readBytes(self, ykrId):
+        """
+        :param ykrId: Destination YKR_ID.
+        :return: Bytes of the "travel_times_to_<ykrId>.txt" file.
+        """
+        position = self.ykrIndex.getPositions(ykrId)[0]
+        with open(self.archivePath, 'rb') as f:
+            f.seek(int(self.offsets[position]))
+            return self.decompress(f.read(int(self.lengths[position])))
+
+    def read(self, ykrId, sep=";", usecols=None):
+        """
+        :param ykrId: Destination YKR_ID.
+        :param sep: Separator of the text file.
+        :param usecols: Columns to read, by default all of them.
+        :return: DataFrame of the travel times to the destination.
+        """
+        return pd.read_csv(io.BytesIO(self.readBytes(ykrId)), sep=sep, usecols=usecols)
+
+
+@dgl_timer
+def compileTravelTimeMatrixArchive(travelTimeMatrixURL, archivePath, ykrIndex=None, codec=None, level=None):
+    """
+    Pack the travel time matrix text files into one MatrixArchive.
+
+    :param travelTimeMatrixURL: Root folder of the travel time matrix text files.
+    :param archivePath: Output archive file.
+    :param ykrIndex: YKRIndex of the files, by default the files found from the travel time matrix folder.
+    :param codec: CODEC_ZSTD or CODEC_ZLIB, by default zstd when available.
+    :param level: Compression level of the codec.
+    :return: MatrixArchive reading the written archive.
+    """
+    if ykrIndex is None:
+        ykrIndex = YKRIndex.build(matrixFolder=travelTimeMatrixURL)
+
+    with MatrixArchiveWriter(archivePath, codec=codec, level=level) as writer:
+        Logger.getInstance().info("Packing the travel time matrix files into a %s archive: %s"
+                                  % (CODEC_NAMES[writer.codec], archivePath))
+        for ykrId in ykrIndex.ids.tolist():
+            matrixFile = ykrIndex.getFile(ykrId)
+            if matrixFile is None:
+                continue
+            with open(matrixFile, 'rb') as f:
+                writer.writeBlock(ykrId, f.read())
+
+    return MatrixArchive(archivePath)
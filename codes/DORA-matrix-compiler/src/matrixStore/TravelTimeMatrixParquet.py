@@ -0,0 +1,129 @@
+import os
+
+import numpy as np
+
+from codes.src.matrixStore.TravelTimeMatrixReader import ID_COLUMNS, readValueColumns
+from codes.src.matrixStore.TravelTimeMatrixStore import getColumnDtype
+from codes.src.matrixStore.YKRIndex import YKRIndex
+from codes.src.util import dgl_timer, Logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+PARTITION_COLUMN = "to_id_range"
+PARTITION_SIZE = 1000
+ROW_GROUP_SIZE = 65536
+
+
+def getPartition(ykrIds, partitionSize=PARTITION_SIZE):
+    """
+    :param ykrIds: Destination YKR_ID or YKR_IDs.
+    :param partitionSize: Number of consecutive YKR_IDs per partition, by default the "<4 digits>xxx" folders.
+    :return: Partition key(s) of the destinations.
+    """
+    return np.asarray(ykrIds, dtype=np.int64) // partitionSize
+
+
+def requirePyarrow():
+    if pa is None:
+        raise ImportError("The pyarrow package is required to read and write the Parquet travel time matrix")
+
+
+@dgl_timer
+def compileTravelTimeMatrixParquet(travelTimeMatrixURL, datasetFolder, ykrIndex=None, partitionSize=PARTITION_SIZE,
+                                   rowGroupSize=ROW_GROUP_SIZE, sep=";"):
+    """
+    Convert the travel time matrix text files into a Parquet dataset partitioned by destination range
+    ("to_id_range=<to_id // partitionSize>").
+
+    The rows of each partition are sorted by "from_id" and split into row groups of "rowGroupSize" rows, so the
+    "from_id" statistics of the row groups let readers skip the groups without the wanted origins.
+
+    :param travelTimeMatrixURL: Root folder of the travel time matrix text files.
+    :param datasetFolder: Output folder of the dataset.
+    :param ykrIndex: YKRIndex of the files, by default the files found from the travel time matrix folder.
+    :param partitionSize: Number of consecutive destination YKR_IDs per partition.
+    :param rowGroupSize: Maximum number of rows per row group.
+    :param sep: Separator of the text files.
+    :return: List of the written Parquet files.
+    """
+    requirePyarrow()
+    if ykrIndex is None:
+        ykrIndex = YKRIndex.build(matrixFolder=travelTimeMatrixURL)
+
+    ids = np.asarray(ykrIndex.ids)
+    partitions = getPartition(ids, partitionSize)
+
+    writtenFiles = []
+    for partition in np.unique(partitions).tolist():
+        tables = []
+        for to_id in ids[partitions == partition].tolist():
+            matrixFile = ykrIndex.getFile(to_id)
+            if matrixFile is None:
+                continue
+            tables.append(readMatrixFile(matrixFile, sep))
+
+        if not tables:
+            continue
+
+        table = pa.concat_tables(tables, promote_options="default")
+        table = table.sort_by([("from_id", "ascending"), ("to_id", "ascending")])
+
+        partitionFolder = os.path.join(datasetFolder, "%s=%s" % (PARTITION_COLUMN, partition))
+        if not os.path.exists(partitionFolder):
+            os.makedirs(partitionFolder)
+        partitionFile = os.path.join(partitionFolder, "part-0.parquet")
+        pq.write_table(table, partitionFile, row_group_size=rowGroupSize, write_statistics=True)
+        writtenFiles.append(partitionFile)
+
+    Logger.getInstance().info("Wrote %s destinations into %s Parquet partitions: %s"
+                              % (len(ykrIndex.getFiles(ids)), len(writtenFiles), datasetFolder))
+    return writtenFiles
+
+
+def readMatrixFile(matrixFile, sep=";"):
+    """
+    :return: pyarrow Table of a "travel_times_to_<YKR_ID>.txt" file with the store dtypes.
+    """
+    columns = ID_COLUMNS + readValueColumns(matrixFile, sep=sep)
+    columnTypes = {column: pa.from_numpy_dtype(np.dtype("int32" if column in ID_COLUMNS else getColumnDtype(column)))
+                   for column in columns}
+    return pacsv.read_csv(matrixFile, parse_options=pacsv.ParseOptions(delimiter=sep),
+                          convert_options=pacsv.ConvertOptions(include_columns=columns, column_types=columnTypes))
+
+
+def queryTravelTimeMatrixParquet(datasetFolder, fromIds=None, toIds=None, columns=None,
+                                 partitionSize=PARTITION_SIZE):
+    """
+    Read the origin/destination subset of a dataset written by "compileTravelTimeMatrixParquet". The destinations
+    prune the partitions and the origins the row groups, only the requested columns are decoded.
+
+    :param datasetFolder: Folder of the dataset.
+    :param fromIds: Origin YKR_IDs, by default every origin.
+    :param toIds: Destination YKR_IDs, by default every destination.
+    :param columns: Value columns to read, by default all of them.
+    :param partitionSize: Partition size used when the dataset was written.
+    :return: DataFrame with "from_id", "to_id" and the value columns.
+    """
+    requirePyarrow()
+    dataset = ds.dataset(datasetFolder, format="parquet", partitioning="hive")
+
+    expression = None
+    if toIds is not None:
+        toIds = np.unique(np.asarray(toIds, dtype=np.int32))
+        expression = ds.field(PARTITION_COLUMN).isin(np.unique(getPartition(toIds, partitionSize)).tolist()) & \
+                     ds.field("to_id").isin(toIds.tolist())
+    if fromIds is not None:
+        fromFilter = ds.field("from_id").isin(np.unique(np.asarray(fromIds, dtype=np.int32)).tolist())
+        expression = fromFilter if expression is None else expression & fromFilter
+
+    if columns is None:
+        columns = [column for column in dataset.schema.names if column not in ("from_id", "to_id", PARTITION_COLUMN)]
+
+    table = dataset.to_table(columns=["from_id", "to_id"] + list(columns), filter=expression)
+    return table.to_pandas()
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from codes.src.matrixStore.TravelTimeMatrixStore import getColumnDtype, VALUE_COLUMNS
+from codes.src.util import getConfigurationProperties
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+
+ID_COLUMNS = ["from_id", "to_id"]
+READ_BLOCK_SIZE = 1 << 20
+PANDAS_CHUNK_SIZE = 100000
+
+
+def readValueColumns(file, columns=None, sep=";"):
+    """
+    :param file: Travel time matrix text file.
+    :param columns: Wanted value columns, by default every value column.
+    :param sep: Separator of the file.
+    :return: The wanted value columns found from the header of the file, in the order of the header.
+    """
+    with open(file) as f:
+        header = f.readline().rstrip("\r\n").split(sep)
+    wanted = set(columns if columns is not None else VALUE_COLUMNS)
+    return [column for column in header if column in wanted]
+
+
+class TravelTimeMatrixReader(object):
+    def __init__(self, originIDs, columns=None, sep=";"):
+        """
+        Read the rows of the given origins from "travel_times_to_<YKR_ID>.txt" files.
+
+        The files are streamed block by block with only the requested columns converted to their fixed store dtypes,
+        and each block is filtered by "from_id" before it is kept, so the rows of the other origins are never
+        materialized. The pyarrow CSV reader is used when pyarrow is installed, otherwise pandas reads the file in
+        chunks.
+
+        :param originIDs: YKR_IDs of the wanted origins.
+        :param columns: Value columns to read (e.g. ["pt_r_t", "car_r_t"]), by default the value columns found from
+            the header of each file.
+        :param sep: Separator of the text files.
+        """
+        self.originIDs = np.unique(np.asarray(originIDs, dtype=np.int32))
+        self.columns = list(columns) if columns is not None else None
+        self.sep = sep
+        self.dtypes = {column: getColumnDtype(column) for column in VALUE_COLUMNS + list(columns or [])}
+        self.dtypes.update({column: "int32" for column in ID_COLUMNS})
+
+    def read(self, file):
+        """
+        :param file: Travel time matrix text file.
+        :return: DataFrame with "from_id", "to_id" and the requested columns of the matching rows, in file order.
+        """
+        columns = self.columns if self.columns is not None else readValueColumns(file, sep=self.sep)
+        if pa is not None:
+            return self.__readWithPyarrow(file, columns)
+        return self.__readWithPandas(file, columns)
+
+    def readFiles(self, files, jobs=None):
+        """
+        :param files: Travel time matrix text files, e.g. from YKRIndex.getFiles.
+        :param jobs: Number of reader threads, by default "jobs" in the PARALLELIZATION configuration.
+        :return: One DataFrame with the matching rows of every file, in the order of the files.
+        """
+        config = getConfigurationProperties(section="PARALLELIZATION")
+        jobs = int(jobs if jobs is not None else config["jobs"])
+
+        with Parallel(n_jobs=jobs, backend="threading", verbose=int(config["verbose"])) as parallel:
+            selections = parallel(delayed(self.read)(file) for file in files)
+
+        selections = [selection for selection in selections if len(selection) > 0]
+        if not selections:
+            return self.__emptyDataFrame(self.columns or [])
+        return pd.concat(selections, ignore_index=True)
+
+    def __readWithPyarrow(self, file, columns):
+        includeColumns = ID_COLUMNS + columns
+        reader = pacsv.open_csv(
+            file,
+            read_options=pacsv.ReadOptions(block_size=READ_BLOCK_SIZE),
+            parse_options=pacsv.ParseOptions(delimiter=self.sep),
+            convert_options=pacsv.ConvertOptions(
+                include_columns=includeColumns,
+                column_types={column: pa.from_numpy_dtype(np.dtype(self.dtypes[column])) for column in includeColumns}
+            )
+        )
+
+        valueSet = pa.array(self.originIDs)
+        batches = []
+        for batch in reader:
+            selected = batch.filter(pc.is_in(batch.column(0), value_set=valueSet))
+            if selected.num_rows > 0:
+                batches.append(selected)
+
+        if not batches:
+            return self.__emptyDataFrame(columns)
+        return pa.Table.from_batches(batches, schema=reader.schema).to_pandas()
+
+    def __readWithPandas(self, file, columns):
+        chunks = []
+        for chunk in pd.read_csv(file, sep=self.sep, usecols=ID_COLUMNS + columns, dtype=self.dtypes,
+                                 chunksize=PANDAS_CHUNK_SIZE):
+            selected = chunk[chunk["from_id"].isin(self.originIDs)]
+            if len(selected) > 0:
+                chunks.append(selected)
+
+        if not chunks:
+            return self.__emptyDataFrame(columns)
+        return pd.concat(chunks, ignore_index=True)[ID_COLUMNS + columns]
+
+    def __emptyDataFrame(self, columns):
+        columns = ID_COLUMNS + columns
+        return pd.DataFrame({column: np.array([], dtype=self.dtypes[column]) for column in columns}, columns=columns)
@@ -0,0 +1,178 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from codes.src.matrixStore.YKRIndex import YKRIndex
+from codes.src.util import dgl_timer, Logger
+
+MATRIX_COLUMNS = ['from_id', 'to_id', 'walk_t', 'walk_d', 'bike_f_t', 'bike_s_t', 'bike_d', 'pt_r_tt', 'pt_r_t',
+                  'pt_r_d', 'pt_m_tt', 'pt_m_t', 'pt_m_d', 'car_r_t', 'car_r_d', 'car_m_t', 'car_m_d', 'car_sl_t']
+VALUE_COLUMNS = MATRIX_COLUMNS[2:]
+
+NODATA_VALUE = -1
+
+STORE_VERSION = 1
+METADATA_FILENAME = "metadata.json"
+
+
+def getColumnDtype(column):
+    """
+    Travel times (minutes) fit into int16. Distances (meters) reach over 100 km in the Helsinki region, which do not fit
+    into 16 bits, so they are stored as int32. Both are signed to keep the -1 NoData value.
+
+    :param column: Travel time matrix column name.
+    :return: numpy dtype name.
+    """
+    if column.endswith("_d"):
+        return "int32"
+    return "int16"
+
+
+@dgl_timer
+def compileTravelTimeMatrixStore(travelTimeMatrixURL, storeFolder, ykrIndex=None, sep=";"):
+    """
+    Pack the travel time matrix text files into one memory-mappable ".npy" array per value column.
+
+    Each array has shape (destinations, origins), so the travel times to a destination are one contiguous row. The
+    row/column position of a YKR_ID is its dense position in the YKRIndex, which is stored next to the columns.
+
+    :param travelTimeMatrixURL: Root folder of the travel time matrix text files.
+    :param storeFolder: Output folder of the store.
+    :param ykrIndex: YKRIndex of the grid, by default the destinations found from the travel time matrix folder.
+    :param sep: Separator of the text files.
+    :return: TravelTimeMatrixStore reading the compiled store.
+    """
+    if ykrIndex is None:
+        ykrIndex = YKRIndex.build(matrixFolder=travelTimeMatrixURL)
+
+    ids = np.asarray(ykrIndex.ids)
+    size = len(ids)
+
+    ykrIndex.save(storeFolder)
+
+    arrays = {}
+    for column in VALUE_COLUMNS:
+        arrays[column] = np.lib.format.open_memmap(os.path.join(storeFolder, column + ".npy"), mode="w+",
+                                                   dtype=getColumnDtype(column), shape=(size, size))
+        arrays[column][:] = NODATA_VALUE
+
+    Logger.getInstance().info("Packing %s travel time matrix files into %s"
+                              % (len(ykrIndex.getFiles(ids)), storeFolder))
+
+    for toPosition, to_id in enumerate(ids.tolist()):
+        matrixFile = ykrIndex.getFile(to_id)
+        if matrixFile is None:
+            Logger.getInstance().warning("Travel time matrix file not found for destination %s" % to_id)
+            continue
+
+        data = pd.read_csv(matrixFile, sep=sep, usecols=lambda column: column in MATRIX_COLUMNS)
+
+        fromIds = data["from_id"].values
+        isInGrid, fromPositions = ykrIndex.lookup(fromIds)
+
+        for column in VALUE_COLUMNS:
+            if column in data.columns:
+                values = data[column].fillna(NODATA_VALUE).round().values[isInGrid]
+                arrays[column][toPosition, fromPositions[isInGrid]] = values
+
+    for column in VALUE_COLUMNS:
+        arrays[column].flush()
+
+    metadata = {
+        "version": STORE_VERSION,
+        "size": size,
+        "nodata": NODATA_VALUE,
+        "columns": {column: getColumnDtype(column) for column in VALUE_COLUMNS}
+    }
+    with open(os.path.join(storeFolder, METADATA_FILENAME), 'w+') as outfile:
+        json.dump(metadata, outfile, sort_keys=True)
+
+    del arrays
+    return TravelTimeMatrixStore(storeFolder)
+
+
+class TravelTimeMatrixStore(object):
+    def __init__(self, storeFolder):
+        """
+        Read-only access to a store compiled by "compileTravelTimeMatrixStore". The column arrays are memory-mapped
+        lazily, so slicing an origin or destination only touches the pages that hold its values.
+
+        :param storeFolder: Folder of the compiled store.
+        """
+        self.storeFolder = storeFolder
+
+        with open(os.path.join(storeFolder, METADATA_FILENAME)) as f:
+            self.metadata = json.load(f)
+
+        self.ykrIndex = YKRIndex.load(storeFolder)
+        self.ids = np.asarray(self.ykrIndex.ids)
+        self.columns = sorted(self.metadata["columns"], key=VALUE_COLUMNS.index)
+        self.__arrays = {}
+
+    def getColumn(self, column):
+        """
+        :param column: Value column name (e.g. "pt_r_t").
+        :return: Memory-mapped array of shape (destinations, origins).
+        """
+        if column not in self.__arrays:
+            if column not in self.metadata["columns"]:
+                raise KeyError("Unknown travel time matrix column: %s" % column)
+            self.__arrays[column] = np.load(os.path.join(self.storeFolder, column + ".npy"), mmap_mode="r")
+        return self.__arrays[column]
+
+    def getPositions(self, ykrIds):
+        """
+        Translate YKR_IDs into row/column positions of the store.
+
+        :param ykrIds: YKR_ID or list of YKR_IDs.
+        :return: numpy array of positions.
+        """
+        return self.ykrIndex.getPositions(ykrIds)
+
+    def getTravelTimesTo(self, to_id, columns=None):
+        """
+        :param to_id: Destination YKR_ID.
+        :param columns: Value columns to retrieve, by default all of them.
+        :return: DataFrame with the same layout as the "travel_times_to_<to_id>.txt" file.
+        """
+        toPosition = self.getPositions(to_id)[0]
+        return self.__createDataFrame(fromIds=self.ids, toIds=np.full(len(self.ids), to_id, dtype=self.ids.dtype),
+                                      rows=toPosition, cols=slice(None), columns=columns)
+
+    def getTravelTimesFrom(self, from_id, columns=None):
+        """
+        :param from_id: Origin YKR_ID.
+        :param columns: Value columns to retrieve, by default all of them.
+        :return: DataFrame with the travel times from the origin to every destination.
+        """
+        fromPosition = self.getPositions(from_id)[0]
+        return self.__createDataFrame(fromIds=np.full(len(self.ids), from_id, dtype=self.ids.dtype), toIds=self.ids,
+                                      rows=slice(None), cols=fromPosition, columns=columns)
+
+    def getSubset(self, fromIds, toIds, columns=None):
+        """
+        Retrieve every origin/destination pair combination of the given YKR_IDs.
+
+        :param fromIds: Origin YKR_IDs.
+        :param toIds: Destination YKR_IDs.
+        :param columns: Value columns to retrieve, by default all of them.
+        :return: DataFrame ordered by destination and origin.
+        """
+        fromPositions = self.getPositions(fromIds)
+        toPositions = self.getPositions(toIds)
+        return self.__createDataFrame(fromIds=np.tile(self.ids[fromPositions], len(toPositions)),
+                                      toIds=np.repeat(self.ids[toPositions], len(fromPositions)),
+                                      rows=toPositions[:, np.newaxis], cols=fromPositions[np.newaxis, :],
+                                      columns=columns)
+
+    def __createDataFrame(self, fromIds, toIds, rows, cols, columns):
+        if columns is None:
+            columns = self.columns
+
+        data = {"from_id": fromIds, "to_id": toIds}
+        for column in columns:
+            data[column] = np.asarray(self.getColumn(column)[rows, cols]).ravel()
+
+        return pd.DataFrame(data, columns=["from_id", "to_id"] + list(columns))
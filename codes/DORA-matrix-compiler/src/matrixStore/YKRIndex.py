@@ -0,0 +1,166 @@
+import json
+import os
+import re
+
+import geopandas as gpd
+import numpy as np
+
+INDEX_FILENAME = "ykr_index.npy"
+INDEX_METADATA_FILENAME = "ykr_index.json"
+
+matrixFilenamePattern = re.compile(r"^travel_times_to_\s*(\d+)\.txt$")
+
+
+def listMatrixFiles(topPath, filenamePattern=matrixFilenamePattern):
+    """
+    Find the files whose name matches "filenamePattern" from the directory and sub-folders of "topPath".
+
+    :param topPath: Root folder (e.g. the travel time matrix with its <4 digits>xxx folders).
+    :param filenamePattern: Compiled regular expression whose first group is the YKR_ID.
+    :return: Dictionary YKR_ID -> file path.
+    """
+    matrixFiles = {}
+    for root, dirs, files in os.walk(topPath):
+        for filename in files:
+            match = filenamePattern.match(filename)
+            if match:
+                matrixFiles[int(match.group(1))] = os.path.join(root, filename)
+    return matrixFiles
+
+
+class YKRIndex(object):
+    def __init__(self, entries, root=None):
+        """
+        Sorted YKR_ID lookup table. The dense position of a YKR_ID is its position in the table, which is also the
+        row/column position used by the TravelTimeMatrixStore.
+
+        Use YKRIndex.build, YKRIndex.fromIds, YKRIndex.fromGridFile or YKRIndex.load to create a new index.
+
+        :param entries: numpy structured array with "ykr_id" and "path" fields sorted by "ykr_id".
+        :param root: Folder that the stored paths are relative to.
+        """
+        self.entries = entries
+        self.ids = entries["ykr_id"]
+        self.root = root
+
+    @staticmethod
+    def build(ykrIds=None, matrixFolder=None, filenamePattern=matrixFilenamePattern):
+        """
+        Scan the "matrixFolder" once and index its files by YKR_ID.
+
+        :param ykrIds: YKR_IDs of the grid, by default the YKR_IDs found from the "matrixFolder".
+        :param matrixFolder: Root folder of the files to index.
+        :param filenamePattern: Compiled regular expression whose first group is the YKR_ID of the file.
+        :return: New YKRIndex.
+        """
+        matrixFiles = listMatrixFiles(matrixFolder, filenamePattern) if matrixFolder else {}
+        if ykrIds is None:
+            ykrIds = list(matrixFiles.keys())
+
+        ykrIds = np.asarray(ykrIds, dtype=np.int32).tolist()
+        paths = [os.path.relpath(matrixFiles[ykrId], matrixFolder) if ykrId in matrixFiles else ""
+                 for ykrId in ykrIds]
+        return YKRIndex.fromIds(ykrIds, paths, root=matrixFolder)
+
+    @staticmethod
+    def fromIds(ykrIds, paths=None, root=None):
+        """
+        Index plain YKR_IDs without scanning any folder, e.g. the blocks of a MatrixArchive or the input matrices of
+        the compiler.
+
+        :param ykrIds: YKR_IDs, only the first occurrence of a repeated YKR_ID is indexed.
+        :param paths: File path of each YKR_ID (relative to "root", "" for no file), by default no file at all.
+        :param root: Folder that the paths are relative to.
+        :return: New YKRIndex.
+        """
+        ids, first = np.unique(np.asarray(ykrIds, dtype=np.int32), return_index=True)
+        paths = [paths[position].encode("utf-8") for position in first.tolist()] if paths is not None else []
+        pathLength = max([len(path) for path in paths] + [1])
+
+        entries = np.zeros(len(ids), dtype=[("ykr_id", "i4"), ("path", "S%s" % pathLength)])
+        entries["ykr_id"] = ids
+        if paths:
+            entries["path"] = paths
+
+        return YKRIndex(entries, root=root)
+
+    @staticmethod
+    def fromGridFile(gridURL, matrixFolder=None, gridID="YKR_ID"):
+        """
+        :param gridURL: YKR grid file (e.g. MetropAccess_YKR_grid_EurefFIN.shp).
+        :param matrixFolder: Root folder of the files to index.
+        :param gridID: YKR_ID column of the grid.
+        :return: New YKRIndex with every grid cell.
+        """
+        grid = gpd.read_file(gridURL)
+        return YKRIndex.build(ykrIds=grid[gridID].values, matrixFolder=matrixFolder)
+
+    def save(self, folder):
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+        np.save(os.path.join(folder, INDEX_FILENAME), self.entries)
+        with open(os.path.join(folder, INDEX_METADATA_FILENAME), 'w+') as outfile:
+            json.dump({"root": self.root}, outfile, sort_keys=True)
+
+    @staticmethod
+    def load(folder, mmap=True):
+        """
+        :param folder: Folder where the index was saved.
+        :param mmap: Memory-map the index instead of reading it into memory.
+        :return: The saved YKRIndex.
+        """
+        entries = np.load(os.path.join(folder, INDEX_FILENAME), mmap_mode="r" if mmap else None)
+        with open(os.path.join(folder, INDEX_METADATA_FILENAME)) as f:
+            metadata = json.load(f)
+        return YKRIndex(entries, root=metadata["root"])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, ykrId):
+        return bool(self.lookup(ykrId)[0][0])
+
+    def lookup(self, ykrIds):
+        """
+        Vectorized binary search of the YKR_IDs.
+
+        :param ykrIds: YKR_ID or list of YKR_IDs.
+        :return: Tuple (found, positions) of numpy arrays, the positions of the YKR_IDs not found are meaningless.
+        """
+        ykrIds = np.atleast_1d(np.asarray(ykrIds, dtype=self.ids.dtype))
+        if len(self.ids) == 0:
+            return np.zeros(len(ykrIds), dtype=bool), np.zeros(len(ykrIds), dtype=np.intp)
+        positions = np.searchsorted(self.ids, ykrIds)
+        positions[positions >= len(self.ids)] = 0
+        found = np.asarray(self.ids[positions] == ykrIds)
+        return found, positions
+
+    def getPositions(self, ykrIds):
+        """
+        :param ykrIds: YKR_ID or list of YKR_IDs.
+        :return: numpy array with the dense position of each YKR_ID.
+        """
+        found, positions = self.lookup(ykrIds)
+        if not found.all():
+            raise KeyError("YKR_IDs not found in the index: %s" % np.atleast_1d(ykrIds)[~found].tolist())
+        return positions
+
+    def getFile(self, ykrId):
+        """
+        :param ykrId: YKR_ID.
+        :return: File path of the YKR_ID or None if it was not found.
+        """
+        files = self.getFiles([ykrId])
+        return files[0] if files else None
+
+    def getFiles(self, ykrIds):
+        """
+        Replacement of "selectFilesQuery", the YKR_IDs that are not indexed or have no file are skipped.
+
+        :param ykrIds: List of YKR_IDs.
+        :return: List of file paths in the same order than the YKR_IDs.
+        """
+        found, positions = self.lookup(ykrIds)
+        paths = self.entries["path"][positions[found]]
+        return [os.path.join(self.root or "", path.decode("utf-8")) for path in paths if path]
@@ -6,13 +6,20 @@ import traceback
 # dir_path = os.path.dirname(os.path.realpath(__file__))
 # os.chdir(os.path.join(os.sep.join(dir_path.split(os.sep)[0:-1])))
 # print("Working directory: %s" % os.getcwd())
-import zipfile
 
 from codes.src.comparison.Comparison import Comparison
 from codes.src.connection.PostgresServiceProvider import PostGISServiceProvider
-from codes.src.exceptions import NotParameterGivenException, NotUploadedTravelTimeMatrixException
+from codes.src.exceptions import NotParameterGivenException
+from codes.src.matrixStore.MatrixArchive import compileTravelTimeMatrixArchive
+from codes.src.matrixStore.TravelTimeMatrixParquet import compileTravelTimeMatrixParquet
+from codes.src.matrixStore.TravelTimeMatrixStore import compileTravelTimeMatrixStore
+from codes.src.travelTimeMatrixOperations.ParallelCopyLoader import ParallelCopyLoader
 from codes.src.travelTimeMatrixOperations.SpatialPatterns import SpatialPatterns
-from codes.src.util import getConfigurationProperties, Logger, FileActions, dgl_timer
+from codes.src.util import getConfigurationProperties, Logger, FileActions
+
+ARCHIVE_FILENAME = "travel_time_matrix.ttma"
+PARQUET_FOLDER = "travel_time_matrix_parquet"
+EXPORT_FORMATS = ("geojson", "flatgeobuf")
 
 
 def printHelp():
@@ -21,12 +28,20 @@ def printHelp():
         "\n\t[--help]: Print information about the parameters necessary to run the tool."
         "\n\t[-q, --query]: Execute travel time matrix query function."
         "\n\t[-u, --upload]: Execute travel time matrix data upload function."
+        "\n\t[-c, --compileStore]: Pack the travel time matrix text files into a memory-mappable store."
+        "\n\t[--compileArchive]: Pack the travel time matrix text files into one compressed seekable archive."
+        "\n\t[--compileParquet]: Convert the travel time matrix text files into a Parquet dataset partitioned by to_id."
         "\n\t"
         "\n\t[-z, --zip]: Zip file path containing the cost summary values."
         "\n\t[-o, --outputFolder]: The output folder to decompress the cost summary geojson files."
+        "\n\t[--staging]: Upload each member into an UNLOGGED staging table before appending it to the target table."
         "\n\t"
         "\n\t[-d, --directionality]: Directionality (to or from) to define either the start or end point of the travel matrix."
         "\n\t[-t, --targets]: Ids (separated by comma ',') of the grid square centroid to retrieve the travel time matrix."
+        "\n\t[-f, --format]: Output format of the queried travel time matrices (geojson or flatgeobuf)."
+        "\n\t[--serverSide]: Let PostGIS build the geojson features (flatgeobuf is always built by PostGIS)."
+        "\n\t"
+        "\n\t[-m, --matrixFolder]: Root folder of the travel time matrix text files to be packed into the store."
         "\n\t"
         "\n\nDirectionality values allowed:"
         "\n\tTO"
@@ -37,14 +52,22 @@ def printHelp():
 def main():
     argv = sys.argv[1:]
     opts, args = getopt.getopt(
-        argv, "q:u:z:o:d:t:",
-        ["query", "upload", "zip=", "outputFolder=", "directionality=", "targets", "help"]
+        argv, "q:u:cz:o:d:t:m:f:",
+        ["query", "upload", "compileStore", "zip=", "outputFolder=", "directionality=", "targets", "matrixFolder=",
+         "staging", "format=", "serverSide", "compileArchive", "compileParquet", "help"]
     )
 
     zippath = None
     outputFolder = None
     uploading = False
     querying = False
+    compilingStore = False
+    compilingArchive = False
+    compilingParquet = False
+    staging = False
+    exportFormat = "geojson"
+    serverSide = False
+    matrixFolder = None
     directionality = "TO"
     targets = ""
 
@@ -61,6 +84,18 @@ def main():
         if opt in ("-q", "--query"):
             querying = True
 
+        if opt in ("-c", "--compileStore"):
+            compilingStore = True
+
+        if opt in ("--compileArchive",):
+            compilingArchive = True
+
+        if opt in ("--compileParquet",):
+            compilingParquet = True
+
+        if opt in ("--staging",):
+            staging = True
+
         if opt in ("-z", "--zip"):
             zippath = arg
 
@@ -73,14 +108,76 @@ def main():
         if opt in ("-t", "--targets"):
             targets = arg
 
+        if opt in ("-m", "--matrixFolder"):
+            matrixFolder = arg
+
+        if opt in ("-f", "--format"):
+            exportFormat = arg
+
+        if opt in ("--serverSide",):
+            serverSide = True
+
+    if exportFormat not in EXPORT_FORMATS:
+        printHelp()
+        raise NotParameterGivenException("Unknown output format: %s. Type --help for more information." % exportFormat)
     if uploading and (not zippath or not outputFolder):
         raise NotParameterGivenException("Type --help for more information.")
     if querying and (not outputFolder or targets is None):
         raise NotParameterGivenException("Type --help for more information.")
+    if (compilingStore or compilingArchive or compilingParquet) and (not matrixFolder or not outputFolder):
+        raise NotParameterGivenException("Type --help for more information.")
+
+    if compilingStore:
+        runTravelTimeMatrixStoreCompilation(matrixFolder, outputFolder)
+
+    if compilingArchive:
+        runTravelTimeMatrixArchiveCompilation(matrixFolder, outputFolder)
+
+    if compilingParquet:
+        runTravelTimeMatrixParquetCompilation(matrixFolder, outputFolder)
+
+    runTravelTimeMatrixOperations(querying, uploading, outputFolder, zippath, directionality, targets, staging,
+                                  exportFormat, serverSide)
+
+
+def runTravelTimeMatrixStoreCompilation(matrixFolder, outputFolder):
+    try:
+        Logger.configureLogger(outputFolder, "compiling_store")
+        store = compileTravelTimeMatrixStore(travelTimeMatrixURL=matrixFolder, storeFolder=outputFolder)
+        Logger.getInstance().info("Compiled %s x %s travel time matrix store: %s"
+                                  % (len(store.ids), len(store.ids), outputFolder))
+    except Exception as err:
+        exc_type, exc_value, exc_traceback = sys.exc_info()
+        lines = traceback.format_exception(exc_type, exc_value, exc_traceback)
+        Logger.getInstance().exception(''.join('>> ' + line for line in lines))
 
-    runTravelTimeMatrixOperations(querying, uploading, outputFolder, zippath, directionality, targets)
 
-def runTravelTimeMatrixOperations(querying, uploading, outputFolder, zippath, directionality, targets):
+def runTravelTimeMatrixArchiveCompilation(matrixFolder, outputFolder):
+    try:
+        Logger.configureLogger(outputFolder, "compiling_archive")
+        archive = compileTravelTimeMatrixArchive(travelTimeMatrixURL=matrixFolder,
+                                                 archivePath=os.path.join(outputFolder, ARCHIVE_FILENAME))
+        Logger.getInstance().info("Compiled %s destinations into the archive: %s"
+                                  % (len(archive), archive.archivePath))
+    except Exception as err:
+        exc_type, exc_value, exc_traceback = sys.exc_info()
+        lines = traceback.format_exception(exc_type, exc_value, exc_traceback)
+        Logger.getInstance().exception(''.join('>> ' + line for line in lines))
+
+
+def runTravelTimeMatrixParquetCompilation(matrixFolder, outputFolder):
+    try:
+        Logger.configureLogger(outputFolder, "compiling_parquet")
+        compileTravelTimeMatrixParquet(travelTimeMatrixURL=matrixFolder,
+                                       datasetFolder=os.path.join(outputFolder, PARQUET_FOLDER))
+    except Exception as err:
+        exc_type, exc_value, exc_traceback = sys.exc_info()
+        lines = traceback.format_exception(exc_type, exc_value, exc_traceback)
+        Logger.getInstance().exception(''.join('>> ' + line for line in lines))
+
+
+def runTravelTimeMatrixOperations(querying, uploading, outputFolder, zippath, directionality, targets, staging=False,
+                                  exportFormat="geojson", serverSide=False):
     try:
         comparison = Comparison()
         postGISServiceProvider = PostGISServiceProvider()
@@ -103,48 +200,39 @@ def runTravelTimeMatrixOperations(querying, uploading, outputFolder, zippath, di
             log_filename = "uploading_" + os.path.basename(zippath).split(".")[-2]
             Logger.configureLogger(outputFolder, log_filename)
 
-            try:
-                zip_ref = zipfile.ZipFile(zippath, 'r')
-
-                members = zip_ref.namelist()
-                Logger.getInstance().info("%s geojson files to be uploaded." % (len(members)))
-                for member in members:
-                    extractZipFile(zip_ref, member, outputFolder)
-                    f = os.path.join(outputFolder, member)
-                    isExecuted = spatialPatterns.insertData(f, tableName, tuple(columnList), outputFolder)
-                    os.remove(f)
-
-                    if not isExecuted:
-                        raise NotUploadedTravelTimeMatrixException(member)
-
-            finally:
-                zip_ref.close()
+            parallelCopyLoader = ParallelCopyLoader(postGISServiceProvider=postGISServiceProvider, staging=staging)
+            parallelCopyLoader.load(zippath, tableName, tuple(columnList), outputFolder)
 
             Logger.getInstance().info("Uploaded: %s" % zippath)
 
         if querying:
             targetList = targets.split(",")
-            for target in targetList:
-                log_filename = "querying_travel_time_matrix_%s_%s" % (directionality, target)
-                Logger.configureLogger(outputFolder, log_filename)
+            log_filename = "querying_travel_time_matrix_%s_%s_targets" % (directionality, len(targetList))
+            Logger.configureLogger(outputFolder, log_filename)
 
+            Logger.getInstance().info("Querying %s: %s" % (directionality, targets))
+            if serverSide or "flatgeobuf".__eq__(exportFormat):
+                spatialPatterns.exportTravelTimeMatrices(ykrids=targetList, tableName=tableName,
+                                                         directionality=directionality, outputFolder=outputFolder,
+                                                         exportFormat=exportFormat)
+                return
+
+            if "TO".__eq__(directionality):
+                travelTimeMatrices = postGISServiceProvider.getTravelTimeMatricesTo(
+                    ykrids=targetList,
+                    tableName=tableName
+                )
+            else:
+                travelTimeMatrices = postGISServiceProvider.getTravelTimeMatricesFrom(
+                    ykrids=targetList,
+                    tableName=tableName
+                )
+
+            for target, geodataframe in travelTimeMatrices:
                 traveltimeMatrixFilename = "travel_time_matrix_%s_%s.geojson" % (directionality, target)
 
-                Logger.getInstance().info("Querying %s: %s" % (directionality, target))
-                if "TO".__eq__(directionality):
-                    geodataframe = postGISServiceProvider.getTravelTimeMatrixTo(
-                        ykrid=target,
-                        tableName=tableName
-                    )
-                else:
-                    geodataframe = postGISServiceProvider.getTravelTimeMatrixFrom(
-                        ykrid=target,
-                        tableName=tableName
-                    )
-
-                geojson = postGISServiceProvider.convertToGeojson(geodataframe)
-
-                fileActions.writeFile(folderPath=outputFolder, filename=traveltimeMatrixFilename, data=geojson)
+                fileActions.writeGeojson(folderPath=outputFolder, filename=traveltimeMatrixFilename,
+                                         geodataframe=geodataframe)
                 Logger.getInstance().info("Find the the travel time matrix geojson file in this path: %s"
                                           % (os.path.join(outputFolder, traveltimeMatrixFilename)))
 
@@ -152,9 +240,3 @@ def runTravelTimeMatrixOperations(querying, uploading, outputFolder, zippath, di
         exc_type, exc_value, exc_traceback = sys.exc_info()
         lines = traceback.format_exception(exc_type, exc_value, exc_traceback)
         Logger.getInstance().exception(''.join('>> ' + line for line in lines))
-
-
-@dgl_timer
-def extractZipFile(zip_ref, member, outputFolder):
-    Logger.getInstance().info("Extracting member: %s" % member)
-    zip_ref.extract(member, outputFolder)
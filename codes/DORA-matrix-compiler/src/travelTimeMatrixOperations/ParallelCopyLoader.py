@@ -0,0 +1,169 @@
+import os
+import threading
+import zipfile
+
+from joblib import Parallel, delayed
+
+from codes.src.connection.PostgresServiceProvider import PostGISServiceProvider
+from codes.src.exceptions import NotUploadedTravelTimeMatrixException
+from codes.src.travelTimeMatrixOperations.SpatialPatterns import SpatialPatterns
+from codes.src.util import getConfigurationProperties, Logger, dgl_timer
+
+
+# Zip files opened by the current worker thread
+openedZipFiles = threading.local()
+
+
+def getZipFile(zippath):
+    """
+    :param zippath: Zip file path.
+    :return: ZipFile opened once per worker thread (and process), so the central directory is not read again for
+        every member. The handle is reopened if the file has changed since it was opened.
+    """
+    zipFiles = getattr(openedZipFiles, "zipFiles", None)
+    if zipFiles is None:
+        zipFiles = openedZipFiles.zipFiles = {}
+
+    stat = os.stat(zippath)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    if zippath not in zipFiles or zipFiles[zippath][0] != signature:
+        if zippath in zipFiles:
+            zipFiles[zippath][1].close()
+        zipFiles[zippath] = (signature, zipfile.ZipFile(zippath, 'r'))
+    return zipFiles[zippath][1]
+
+
+def uploadZipMember(zippath, member, tableName, columns, stagingOf=None):
+    """
+    Worker of the ParallelCopyLoader. It uses the zip file handle of its thread and its own database connection, so
+    it can run in a thread or in a separate process.
+
+    :param stagingOf: Target table of the staging table "tableName". The staging table is created right before the
+        COPY and dropped if the COPY fails, so only the members being copied have a staging table.
+    :return: Tuple (member, error message or None).
+    """
+    postGISServiceProvider = PostGISServiceProvider()
+    try:
+        if stagingOf is not None:
+            postGISServiceProvider.createStagingTable(tableName, stagingOf)
+
+        spatialPatterns = SpatialPatterns(comparison=None, postGISServiceProvider=postGISServiceProvider)
+        isExecuted = spatialPatterns.insertZipMember(getZipFile(zippath), member, tableName, columns)
+        if not isExecuted:
+            error = "COPY was not executed"
+        else:
+            error = None
+    except Exception as err:
+        error = "%s: %s" % (type(err).__name__, err)
+
+    if error is not None and stagingOf is not None:
+        try:
+            postGISServiceProvider.executeStatement("DROP TABLE IF EXISTS %s" % tableName)
+        except Exception as err:
+            Logger.getInstance().warning("Staging table %s was not dropped: %s" % (tableName, err))
+
+    return member, error
+
+
+class ParallelCopyLoader(object):
+    def __init__(self, postGISServiceProvider, jobs=None, backend=None, staging=False):
+        """
+        Upload the members of a cost summary zip file with several COPY statements at the same time.
+
+        :param postGISServiceProvider: PostGISServiceProvider used to attach the staging tables.
+        :param jobs: Number of concurrent COPY workers, by default "copy_jobs" in the PARALLELIZATION configuration.
+        :param backend: joblib backend ("threading" or "loky"), by default "copy_backend" in the configuration.
+        :param staging: Copy each member into its own UNLOGGED staging table, and append each one into the target table
+            as soon as its member has been copied.
+        """
+        config = getConfigurationProperties(section="PARALLELIZATION")
+        self.postGISServiceProvider = postGISServiceProvider
+        self.jobs = int(jobs if jobs is not None else config["copy_jobs"])
+        self.backend = backend if backend is not None else config["copy_backend"]
+        self.verbose = int(config["verbose"])
+        self.staging = staging
+
+    def getProgressFile(self, zippath, outputFolder):
+        """
+        :return: Path of the file listing the members of the zip file that are already in the target table.
+        """
+        return os.path.join(outputFolder, os.path.basename(zippath).split(".")[-2] + "_uploaded_members.txt")
+
+    def readUploadedMembers(self, progressFile):
+        if not os.path.exists(progressFile):
+            return set()
+        with open(progressFile) as f:
+            return set(line.rstrip("\n") for line in f if line.strip())
+
+    def recordUploadedMember(self, progressFile, member):
+        with open(progressFile, 'a') as f:
+            f.write(member + "\n")
+
+    def getStagingTableName(self, tableName, memberIndex):
+        return "%s_staging_%s" % (tableName, memberIndex)
+
+    @dgl_timer
+    def load(self, zippath, tableName, columns, outputFolder):
+        """
+        Upload the zip file members that were not uploaded by a previous run.
+
+        The members already uploaded are listed in a progress file in the output folder, so a failed or interrupted
+        upload can be resumed by running it again. Each member is recorded (and, with staging, appended into the target
+        table) as soon as its worker finishes. The errors are reported in the order of the members in the
+        zip file once all of them have been processed.
+
+        :param zippath: Zip file with the CSV cost summaries.
+        :param tableName: Target table name.
+        :param columns: Columns of the target table in the same order than the CSV values.
+        :param outputFolder: Folder of the progress file.
+        :return: List of the uploaded members.
+        """
+        if not os.path.exists(outputFolder):
+            os.makedirs(outputFolder)
+
+        progressFile = self.getProgressFile(zippath, outputFolder)
+        uploadedMembers = self.readUploadedMembers(progressFile)
+
+        with zipfile.ZipFile(zippath, 'r') as zip_ref:
+            members = [member for member in zip_ref.namelist() if not member.endswith("/")]
+
+        pendingMembers = [(index, member) for index, member in enumerate(members) if member not in uploadedMembers]
+        Logger.getInstance().info("%s of %s members to be uploaded with %s %s workers."
+                                  % (len(pendingMembers), len(members), self.jobs, self.backend))
+
+        targetTables = {}
+        memberIndexes = {}
+        for index, member in pendingMembers:
+            targetTables[member] = self.getStagingTableName(tableName, index) if self.staging else tableName
+            memberIndexes[member] = index
+        stagingOf = tableName if self.staging else None
+
+        copiedMembers = []
+        errors = []
+        with Parallel(n_jobs=self.jobs, backend=self.backend, verbose=self.verbose,
+                      return_as="generator_unordered") as parallel:
+            results = parallel(delayed(uploadZipMember)(zippath, member, targetTables[member], columns, stagingOf)
+                               for index, member in pendingMembers)
+
+            for member, error in results:
+                if error is None and self.staging:
+                    try:
+                        self.postGISServiceProvider.attachStagingTable(targetTables[member], tableName, columns)
+                    except Exception as err:
+                        error = "%s: %s" % (type(err).__name__, err)
+
+                if error is None:
+                    copiedMembers.append(member)
+                    self.recordUploadedMember(progressFile, member)
+                else:
+                    errors.append((memberIndexes[member], member, error))
+
+        # The members finish in any order, the errors are reported in the order of the zip file
+        errors.sort()
+        for index, member, error in errors:
+            Logger.getInstance().error("Member %s was not uploaded: %s" % (member, error))
+
+        if errors:
+            raise NotUploadedTravelTimeMatrixException(", ".join(member for index, member, error in errors))
+
+        return copiedMembers
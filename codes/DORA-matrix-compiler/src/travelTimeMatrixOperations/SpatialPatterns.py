@@ -1,6 +1,6 @@
 import os
 
-from codes.src.util import dgl_timer, FileActions, Logger
+from codes.src.util import dgl_timer, FileActions, Logger, ThroughputReader, GeojsonStreamWriter, GPD_CRS
 
 
 class SpatialPatterns(object):
@@ -49,3 +49,90 @@ class SpatialPatterns(object):
         finally:
             csv_file.close()
         return isExecuted
+
+    @dgl_timer
+    def insertZipMember(self, zip_ref, member, tableName, columns):
+        """
+        Upload a CSV member of the zip file straight from the archive, without extracting it to the disk.
+
+        :param zip_ref: Opened zipfile.ZipFile.
+        :param member: Name of the CSV member.
+        :param tableName: Target table name.
+        :param columns: Columns of the target table.
+        :return: True if the statement was executed.
+        """
+        csv_separator = ';'
+
+        with zip_ref.open(member, 'r') as memberFile:
+            reader = ThroughputReader(memberFile)
+            reader.readline()  # dismiss the first row with the column names
+
+            isExecuted = self.postGISServiceProvider.copyStream(stream=reader,
+                                                                tableName=tableName,
+                                                                columns=columns,
+                                                                separator=csv_separator)
+
+        Logger.getInstance().info("Uploaded member %s: %s bytes in %.2f s (%.2f MB/s)"
+                                  % (member, reader.bytesRead, reader.elapsedTime(), reader.throughput()))
+        return isExecuted
+
+    @dgl_timer
+    def exportTravelTimeMatrices(self, ykrids, tableName, directionality, outputFolder, exportFormat="geojson"):
+        """
+        Write the travel time matrix of each target with the features (or FlatGeobuf files) built by PostGIS, the
+        bytes are written to the disk as they arrive from the database.
+
+        :param ykrids: Target YKR_IDs.
+        :param tableName: Travel time matrix table name.
+        :param directionality: "TO" or "FROM".
+        :param outputFolder: Folder of the output files.
+        :param exportFormat: "geojson" or "flatgeobuf".
+        :return: List of the written files.
+        """
+        if "TO".__eq__(directionality):
+            targetColumn, geometryColumn = "ykr_to_id", "ykr_from_id"
+        else:
+            targetColumn, geometryColumn = "ykr_from_id", "ykr_to_id"
+
+        if not os.path.exists(outputFolder):
+            os.makedirs(outputFolder)
+
+        filenamePattern = "travel_time_matrix_%s_%s." + ("fgb" if exportFormat == "flatgeobuf" else "geojson")
+        outputFiles = []
+
+        if exportFormat == "flatgeobuf":
+            flatGeobufs = self.postGISServiceProvider.iterTravelTimeMatricesFlatGeobuf(
+                ykrids, tableName, targetColumn=targetColumn, geometryColumn=geometryColumn)
+            for target, flatGeobuf in flatGeobufs:
+                outputFiles.append(os.path.join(outputFolder, filenamePattern % (directionality, target)))
+                with open(outputFiles[-1], 'wb') as outfile:
+                    outfile.write(flatGeobuf)
+        else:
+            features = self.postGISServiceProvider.iterTravelTimeMatrixFeatures(
+                ykrids, tableName, targetColumn=targetColumn, geometryColumn=geometryColumn)
+            exportedTargets = set()
+            writer = None
+            try:
+                for target, feature in features:
+                    if target not in exportedTargets:
+                        if writer is not None:
+                            writer.close()
+                        outputFiles.append(os.path.join(outputFolder, filenamePattern % (directionality, target)))
+                        writer = GeojsonStreamWriter(outputFiles[-1], crs=GPD_CRS.PSEUDO_MERCATOR).open()
+                        exportedTargets.add(target)
+                    writer.writeRawFeature(feature)
+            finally:
+                if writer is not None:
+                    writer.close()
+
+            # Empty feature collection for the targets without travel times
+            for target in [int(ykrid) for ykrid in ykrids]:
+                if target not in exportedTargets:
+                    outputFiles.append(os.path.join(outputFolder, filenamePattern % (directionality, target)))
+                    GeojsonStreamWriter(outputFiles[-1], crs=GPD_CRS.PSEUDO_MERCATOR).open().close()
+                    exportedTargets.add(target)
+
+        for fileURL in outputFiles:
+            Logger.getInstance().info("Find the the travel time matrix file in this path: %s" % fileURL)
+
+        return outputFiles
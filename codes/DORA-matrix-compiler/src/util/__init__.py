@@ -1,14 +1,22 @@
+import atexit
 import configparser
+import contextlib
+import csv
 import datetime
+import functools
 import json
 import logging
 import logging.config
+import math
 import os
+import random
 import shutil
+import threading
 import time
 import zipfile
 
 import geopandas as gpd
+from shapely.geometry import mapping
 
 from codes.src import exceptions
 
@@ -50,11 +58,81 @@ def timeDifference(startTime, endTime):
     return totalTime
 
 
+CONFIGURATION_PATH_VARIABLE = "DORA_CONFIGURATION"
+CONFIGURATION_OVERRIDE_PREFIX = "DORA_"
+
+# "timerEnabled" of the WFS_CONFIG section, cached whenever the configuration is (re)loaded so "dgl_timer" does not
+# look it up at every call. None until the configuration has been read in this process.
+timerEnabled = None
+
+
+def getResourcePath(filename):
+    """
+    :param filename: File name in the "resources" folder of the package.
+    :return: Absolute path of the resource, independent of the working directory.
+    """
+    packageFolder = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.path.join(packageFolder, "resources", filename)
+
+
+class Configuration(object):
+    """
+    Process-wide configuration, the properties file is read and parsed only once.
+
+    The file is "resources/configuration.properties" of the package unless the "DORA_CONFIGURATION" environment
+    variable gives another path. Any property can be overridden with a "DORA_<SECTION>__<key>" environment variable
+    (e.g. DORA_DATABASE_CONFIG__host=db.example.org).
+    """
+    __instance = None
+    __lock = threading.Lock()
+
+    @staticmethod
+    def getInstance():
+        if Configuration.__instance is None:
+            with Configuration.__lock:
+                if Configuration.__instance is None:
+                    Configuration.__setInstance(Configuration.load())
+        return Configuration.__instance
+
+    @staticmethod
+    def reload(configurationPath=None):
+        """
+        Read the configuration again, e.g. after the file or the environment variables changed.
+
+        :param configurationPath: Properties file, by default the "DORA_CONFIGURATION" or the package one.
+        :return: The new configuration.
+        """
+        with Configuration.__lock:
+            Configuration.__setInstance(Configuration.load(configurationPath))
+        return Configuration.__instance
+
+    @staticmethod
+    def __setInstance(config):
+        global timerEnabled
+        Configuration.__instance = config
+        timerEnabled = "True".__eq__(config.get("WFS_CONFIG", "timerEnabled", fallback="False"))
+
+    @staticmethod
+    def load(configurationPath=None):
+        if configurationPath is None:
+            configurationPath = os.environ.get(CONFIGURATION_PATH_VARIABLE,
+                                               getResourcePath("configuration.properties"))
+
+        config = configparser.ConfigParser()
+        if not config.read(configurationPath):
+            raise FileNotFoundError("Configuration file not found: %s" % configurationPath)
+
+        for variable, value in os.environ.items():
+            if variable.startswith(CONFIGURATION_OVERRIDE_PREFIX) and "__" in variable:
+                section, key = variable[len(CONFIGURATION_OVERRIDE_PREFIX):].split("__", 1)
+                if config.has_section(section):
+                    config.set(section, key, value)
+
+        return config
+
+
 def getConfigurationProperties(section="WFS_CONFIG"):
-    config = configparser.ConfigParser()
-    configurationPath = os.getcwd() + "%codes%resources%configuration.properties".replace("%", os.sep)
-    config.read(configurationPath)
-    return config[section]
+    return Configuration.getInstance()[section]
 
 
 def extractCRS(geojson):
@@ -67,28 +145,183 @@ def extractCRSFromDataframe(dataframe):
     return dataframe.crs["init"].split(":")[1]
 
 
-def dgl_timer(func):
-    def func_wrapper(*args, **kwargs):
-        timerEnabled = "True".__eq__(getConfigurationProperties(section="WFS_CONFIG")["timerEnabled"])
-        if timerEnabled:
-            functionName = func.__name__
-            startTime = time.time()
-            Logger.getInstance().info("%s Start Time: %s" % (functionName, getFormattedDatetime(timemilis=startTime)))
+PROFILER_SAMPLE_SIZE = 4096
 
-            ###############################
-            returns = func(*args, **kwargs)
-            ###############################
 
-            endTime = time.time()
-            Logger.getInstance().info("%s End Time: %s" % (functionName, getFormattedDatetime(timemilis=endTime)))
+class TimerStatistics(object):
+    def __init__(self):
+        """
+        Aggregated latencies (nanoseconds) of one timed function. The p95 is computed from a uniform reservoir sample
+        of at most PROFILER_SAMPLE_SIZE calls, so the memory does not grow with the length of the run.
+        """
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.samples = []
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if self.min is None or elapsed < self.min:
+            self.min = elapsed
+        if self.max is None or elapsed > self.max:
+            self.max = elapsed
+
+        if len(self.samples) < PROFILER_SAMPLE_SIZE:
+            self.samples.append(elapsed)
+        else:
+            index = random.randrange(self.count)
+            if index < PROFILER_SAMPLE_SIZE:
+                self.samples[index] = elapsed
+
+    def percentile(self, q):
+        if not self.samples:
+            return None
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(math.ceil(q / 100.0 * len(samples))) - 1)]
+
+    def toDict(self):
+        return {
+            "count": self.count,
+            "total_ms": self.total / 1e6,
+            "mean_ms": self.total / 1e6 / self.count if self.count else None,
+            "min_ms": self.min / 1e6 if self.min is not None else None,
+            "max_ms": self.max / 1e6 if self.max is not None else None,
+            "p95_ms": self.percentile(95) / 1e6 if self.samples else None
+        }
 
-            totalTime = timeDifference(startTime, endTime)
-            Logger.getInstance().info("%s Total Time: %s m" % (functionName, totalTime))
 
-            return returns
-        else:
+class Profiler(object):
+    """
+    In-memory registry of the latencies measured by "dgl_timer" and "Profiler.measure".
+
+    The statistics are written at process exit to the "timerOutput" file of the WFS_CONFIG section (".csv" or
+    ".json"), or can be read at any time with "Profiler.getStatistics". Worker processes started by the process that
+    imported the Profiler first (e.g. loky workers) write their own "<timerOutput name>_<pid>.<extension>" file.
+    """
+    __registry = {}
+    __lock = threading.Lock()
+
+    @staticmethod
+    def isEnabled():
+        """
+        :return: The "timerEnabled" flag cached by the last (re)load of the Configuration.
+        """
+        if timerEnabled is None:
+            Configuration.getInstance()
+        return timerEnabled
+
+    @staticmethod
+    def record(name, elapsed):
+        """
+        :param name: Name of the timed function or block.
+        :param elapsed: Elapsed time in nanoseconds.
+        """
+        with Profiler.__lock:
+            if name not in Profiler.__registry:
+                Profiler.__registry[name] = TimerStatistics()
+            Profiler.__registry[name].add(elapsed)
+
+    @staticmethod
+    def measure(name):
+        """
+        Context manager timing a block of code, e.g. "with Profiler.measure('read matrix'):".
+
+        :param name: Name of the block in the registry.
+        """
+        if not (timerEnabled if timerEnabled is not None else Profiler.isEnabled()):
+            return contextlib.nullcontext()
+        return Profiler.__measure(name)
+
+    @staticmethod
+    @contextlib.contextmanager
+    def __measure(name):
+        startTime = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            Profiler.record(name, time.perf_counter_ns() - startTime)
+
+    @staticmethod
+    def getStatistics():
+        """
+        :return: Dictionary name -> {count, total_ms, mean_ms, min_ms, max_ms, p95_ms}.
+        """
+        with Profiler.__lock:
+            return {name: statistics.toDict() for name, statistics in Profiler.__registry.items()}
+
+    @staticmethod
+    def reset():
+        with Profiler.__lock:
+            Profiler.__registry.clear()
+
+    @staticmethod
+    def dump(fileURL):
+        """
+        :param fileURL: Output file, written as CSV if it ends with ".csv" and as JSON otherwise.
+        :return: The file URL.
+        """
+        statistics = Profiler.getStatistics()
+        folder = os.path.dirname(fileURL)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+
+        with open(fileURL, 'w+', newline="") as outfile:
+            if fileURL.endswith(".csv"):
+                fields = ["count", "total_ms", "mean_ms", "min_ms", "max_ms", "p95_ms"]
+                writer = csv.writer(outfile)
+                writer.writerow(["function"] + fields)
+                for name in sorted(statistics):
+                    writer.writerow([name] + [statistics[name][field] for field in fields])
+            else:
+                json.dump(statistics, outfile, indent=2, sort_keys=True)
+
+        return fileURL
+
+    @staticmethod
+    def getOutputFile(timerOutput):
+        """
+        :param timerOutput: Configured output file.
+        :return: The output file in the main process, the output file suffixed with the pid in its worker processes.
+        """
+        if os.environ.get(PROFILER_PID_VARIABLE) == str(os.getpid()):
+            return timerOutput
+        root, extension = os.path.splitext(timerOutput)
+        return "%s_%s%s" % (root, os.getpid(), extension)
+
+    @staticmethod
+    def dumpAtExit():
+        timerOutput = getConfigurationProperties(section="WFS_CONFIG").get("timerOutput", "")
+        if timerOutput and Profiler.getStatistics():
+            Profiler.dump(Profiler.getOutputFile(timerOutput))
+
+
+# The worker processes inherit the pid of the main process through the environment
+PROFILER_PID_VARIABLE = "DORA_PROFILER_PID"
+os.environ.setdefault(PROFILER_PID_VARIABLE, str(os.getpid()))
+
+atexit.register(Profiler.dumpAtExit)
+
+
+def dgl_timer(func):
+    """
+    Record the latency of every call of the decorated function in the Profiler. The "timerEnabled" flag cached by the
+    Configuration is checked at every call, so "Configuration.reload()" turns the timers on and off.
+    """
+    functionName = "%s.%s" % (func.__module__, func.__qualname__)
+
+    @functools.wraps(func)
+    def func_wrapper(*args, **kwargs):
+        if not (timerEnabled if timerEnabled is not None else Profiler.isEnabled()):
             return func(*args, **kwargs)
 
+        startTime = time.perf_counter_ns()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            Profiler.record(functionName, time.perf_counter_ns() - startTime)
+
     return func_wrapper
 
 
@@ -249,6 +482,22 @@ class FileActions:
         with open(fileURL, 'w+') as outfile:
             json.dump(data, outfile, sort_keys=True)
 
+    def writeGeojson(self, folderPath, filename, geodataframe, crs=GPD_CRS.PSEUDO_MERCATOR):
+        """
+        Stream the GeoDataFrame to a geojson file in one pass, see GeojsonStreamWriter.
+
+        :return: Path of the geojson file.
+        """
+        if not os.path.exists(folderPath):
+            os.makedirs(folderPath)
+
+        fileURL = folderPath + "/%s" % filename
+
+        with GeojsonStreamWriter(fileURL, crs=crs) as writer:
+            writer.writeGeoDataFrame(geodataframe)
+
+        return fileURL
+
     def createFile(self, folderPath, filename):
         if not os.path.exists(folderPath):
             os.makedirs(folderPath)
@@ -288,6 +537,140 @@ class FileActions:
         zip_ref.close()
 
 
+GEOJSON_CHUNK_SIZE = 10000
+
+
+class GeojsonStreamWriter(object):
+    def __init__(self, fileURL, crs=GPD_CRS.PSEUDO_MERCATOR):
+        """
+        Write a FeatureCollection feature by feature, with the same content than dumping the dictionary returned by
+        "convertToGeojson" with sort_keys=True, but without building it in memory.
+
+        Use it as a context manager, or call open and close explicitly.
+
+        :param fileURL: Output geojson file path.
+        :param crs: GPD_CRS of the features.
+        """
+        self.fileURL = fileURL
+        self.crs = {
+            "properties": {
+                "name": "urn:ogc:def:crs:%s" % (crs["init"].replace(":", "::"))
+            },
+            "type": "name"
+        }
+        self.featureCount = 0
+        self.__file = None
+
+    def open(self):
+        """
+        Create the file and write the header of the FeatureCollection.
+
+        :return: The writer.
+        """
+        self.__file = open(self.fileURL, 'w+')
+        self.__file.write('{"crs": %s, "features": [' % json.dumps(self.crs, sort_keys=True))
+        return self
+
+    def close(self):
+        """
+        Close the FeatureCollection and the file.
+        """
+        self.__file.write('], "type": "FeatureCollection"}')
+        self.__file.close()
+        self.__file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def writeFeature(self, id, properties, geometry):
+        """
+        :param id: Feature id.
+        :param properties: Dictionary of JSON serializable properties.
+        :param geometry: Shapely geometry or None.
+        """
+        feature = {
+            "geometry": mapping(geometry) if geometry is not None else None,
+            "id": str(id),
+            "properties": properties,
+            "type": "Feature"
+        }
+        self.writeRawFeature(json.dumps(feature, sort_keys=True))
+
+    def writeRawFeature(self, feature):
+        """
+        :param feature: Feature already serialized as JSON text (e.g. built by PostGIS).
+        """
+        if self.featureCount > 0:
+            self.__file.write(", ")
+        self.__file.write(feature)
+        self.featureCount += 1
+
+    def writeGeoDataFrame(self, geodataframe, chunkSize=GEOJSON_CHUNK_SIZE):
+        """
+        Write every row of the GeoDataFrame as a feature. The values are converted column by column a chunk of
+        "chunkSize" rows at a time, so only one chunk of Python values is held in memory.
+
+        :param geodataframe: GeoDataFrame with a "geometry" column.
+        :param chunkSize: Rows converted at a time.
+        """
+        propertyColumns = [column for column in geodataframe.columns if column != "geometry"]
+
+        for start in range(0, len(geodataframe), chunkSize):
+            chunk = geodataframe.iloc[start:start + chunkSize]
+
+            propertyValues = []
+            for column in propertyColumns:
+                values = chunk[column].astype(object)
+                propertyValues.append(values.where(values.notnull(), None).tolist())
+
+            ids = chunk.index.tolist()
+            geometries = chunk.geometry.values
+            for position in range(len(chunk)):
+                properties = {column: values[position] for column, values in zip(propertyColumns, propertyValues)}
+                self.writeFeature(ids[position], properties, geometries[position])
+
+
+class ThroughputReader(object):
+    def __init__(self, stream):
+        """
+        Wrap a readable stream (e.g. a zip member opened with ZipFile.open) to measure how many bytes were read from it
+        and how fast.
+
+        :param stream: Readable file-like object.
+        """
+        self.stream = stream
+        self.bytesRead = 0
+        self.startTime = time.perf_counter()
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.bytesRead += len(data)
+        return data
+
+    def readline(self, size=-1):
+        data = self.stream.readline(size)
+        self.bytesRead += len(data)
+        return data
+
+    def elapsedTime(self):
+        """
+        :return: Seconds since the reader was created.
+        """
+        return time.perf_counter() - self.startTime
+
+    def throughput(self):
+        """
+        :return: Read speed in megabytes per second.
+        """
+        elapsedTime = self.elapsedTime()
+        if elapsedTime <= 0:
+            return 0.0
+        return self.bytesRead / (1024.0 * 1024.0) / elapsedTime
+
+
 class Logger:
     __instance = None
     __handler = None
@@ -322,8 +705,7 @@ class Logger:
     @staticmethod
     def getInstance():
         if not Logger.__instance:
-            configurationPath = os.getcwd() + "%codes%resources%logging.properties".replace("%", os.sep)
-            logging.config.fileConfig(configurationPath)
+            logging.config.fileConfig(getResourcePath("logging.properties"))
 
             # create logger
             Logger.__instance = logging.getLogger("CARDAT")
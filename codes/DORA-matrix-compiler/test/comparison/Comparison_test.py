@@ -1,11 +1,15 @@
+import json
 import os
+import shutil
+import tempfile
 import unittest
+import zipfile
 
 import geopandas as gpd
 import pandas as pd
 from shapely.geometry import Polygon
 
-from codes.src.comparison.Comparison import Comparison
+from codes.src.comparison.Comparison import Comparison, readFeatureProperties
 from codes.src.util import FileActions, GPD_CRS
 
 
@@ -240,3 +244,45 @@ class ComparisonTest(unittest.TestCase):
                                    data=geojson)
 
         self.assertIsNotNone(geojson)
+
+    def test_givenAZipOfCostSummaries_then_writeTheirTotalTravelTimesInOneFile(self):
+        tempDir = tempfile.mkdtemp()
+        try:
+            zippath = os.path.join(tempDir, "summaries.zip")
+            with zipfile.ZipFile(zippath, 'w') as zip_ref:
+                for startPoint in [5785640, 5785641]:
+                    properties = {
+                        "startPoint_YKR_ID": str(startPoint), "endPoint_YKR_ID": "5793265",
+                        "costAttribute": "rush_hour_delay_time", "rush_hour_delay_time": 10.0,
+                        "startPoint_EuclideanDistanceWalkingTime": 1.0, "startPoint_AVGWalkingDistanceWalkingTime": 2.0,
+                        "endPoint_ParkingTime": 0.5, "endPoint_AVGWalkingDistanceWalkingTime": 2.0,
+                        "endPoint_EuclideanDistanceWalkingTime": 1.5
+                    }
+                    geometry = {"type": "LineString", "coordinates": [[24.9, 60.2], [24.95, 60.17]]}
+                    summary = {"type": "FeatureCollection",
+                               "crs": {"type": "name", "properties": {"name": "urn:ogc:def:crs:EPSG::4326"}},
+                               "features": [{"type": "Feature", "properties": properties, "geometry": geometry}]}
+                    zip_ref.writestr("summary_%s.geojson" % startPoint, json.dumps(summary))
+
+            outputURL = os.path.join(tempDir, "total_travel_times.csv")
+            rows = self.comparison.calculateTravelTimes(summariesURL=zippath, outputURL=outputURL, jobs=2,
+                                                    chunkSize=1)
+            totals = pd.read_csv(outputURL, sep=";")
+
+            self.assertEqual(2, rows)
+            self.assertListEqual([5785640, 5785641], totals["startPoint_YKR_ID"].tolist())
+            self.assertListEqual([17.0, 17.0], totals["total_travel_time"].tolist())
+        finally:
+            shutil.rmtree(tempDir)
+
+    def test_givenACostSummary_then_decodeOnlyThePropertiesOfTheFeatures(self):
+        properties = {"startPoint_YKR_ID": 5785640, "endPoint_YKR_ID": 5793265, "costAttribute": "distance",
+                      "note": {"properties": "nested"}}
+        summary = json.dumps({
+            "type": "FeatureCollection",
+            "features": [{"type": "Feature", "geometry": {"type": "Point", "coordinates": [24.9, 60.2]},
+                          "properties": properties}],
+            "crs": {"type": "name", "properties": {"name": "urn:ogc:def:crs:EPSG::3067"}}
+        }, indent=2)
+
+        self.assertListEqual([properties], readFeatureProperties(summary))
@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from codes.src.comparison.SelectFiles_tools import selectIdsQuery, selectIdsQueryParallelized
+
+
+class SelectFilesToolsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.files = []
+        for to_id in [5785640, 5785641, 5787544]:
+            filepath = os.path.join(self.dir, "travel_times_to_%s.txt" % to_id)
+            with open(filepath, 'w+') as outfile:
+                outfile.write("from_id;to_id;walk_t;pt_r_t\n")
+                for from_id in [5785640, 5785641, 5787544]:
+                    outfile.write("%s;%s;%s;%s\n" % (from_id, to_id, from_id % 100, to_id % 100))
+            self.files.append(filepath)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_givenManyFiles_then_concatTheSelectionsInTheOrderOfTheFiles(self):
+        for backend in ["threading", "loky"]:
+            selection = selectIdsQueryParallelized(self.files, [5787544, 5785640], searchColumn="from_id",
+                                               sep=";", usecols=["to_id", "pt_r_t"], backend=backend)
+
+            self.assertListEqual([5785640, 5787544] * 3, selection["from_id"].tolist())
+            self.assertListEqual([5785640, 5785640, 5785641, 5785641, 5787544, 5787544], selection["to_id"].tolist())
+            self.assertListEqual(["from_id", "to_id", "pt_r_t"], list(selection.columns))
+
+        self.assertEqual(6, len(selectIdsQuery(self.files, [5787544, 5785640], searchColumn="from_id", sep=";")))
+        self.assertEqual(0, len(selectIdsQueryParallelized([], [5785640], searchColumn="from_id", sep=";")))
@@ -1,5 +1,6 @@
 import os
 import unittest
+from unittest import mock
 
 import geopandas as gpd
 import pandas as pd
@@ -119,6 +120,21 @@ class PostGISServiceProviderTest(unittest.TestCase):
 
         self.assertGreater(len(geojson["features"]), 0)
 
+    def test_givenManyYKRIDs_then_getTheirTravelTimeMatricesWithOneQuery(self):
+        ykrids = [5793265, 5973738, 5878018]
+
+        tableName = "cardat_two_fast_" + self.bicycleTravelTimeMatrix + ""
+
+        travelTimeMatrices = dict(self.postGISServiceProvider.getTravelTimeMatricesTo(
+            ykrids=ykrids,
+            tableName=tableName,
+            chunkSize=1000
+        ))
+
+        self.assertSetEqual(set(ykrids), set(travelTimeMatrices.keys()))
+        for ykrid, geodataframe in travelTimeMatrices.items():
+            self.assertTrue((geodataframe["ykr_to_id"] == ykrid).all())
+
     def test_givenAYKRID_then_getItsTravelTimeMatrixDifferences(self):
         ykrid = 5973738
 
@@ -137,3 +153,71 @@ class PostGISServiceProviderTest(unittest.TestCase):
         self.fileActions.writeFile(folderPath=outputFolder, filename=filename, data=geojson)
 
         self.assertGreater(len(geojson["features"]), 0)
+
+    def test_givenTwoProviders_then_shareTheSameConnectionPool(self):
+        otherPostGISServiceProvider = PostGISServiceProvider()
+
+        engine = self.postGISServiceProvider.getEngine()
+
+        self.assertIs(engine, otherPostGISServiceProvider.getEngine())
+        self.assertTrue(engine.pool._pre_ping)
+
+        PostGISServiceProvider.disposeConnectionPool()
+        self.assertIsNot(engine, PostGISServiceProvider().getEngine())
+
+
+class StoredPairsCursor(object):
+    """
+    Cursor of a mocked connection answering the anti-join of the COPYed pairs with the pairs of "stored".
+    """
+
+    def __init__(self, stored):
+        self.stored = stored
+        self.copied = []
+        self.statements = []
+
+    def execute(self, sql):
+        self.statements.append(sql)
+
+    def copy_expert(self, sql, file):
+        self.statements.append(sql)
+        self.copied = [tuple(float(value) for value in line.split(";")) for line in file.read().splitlines()]
+
+    def fetchall(self):
+        return [pair for pair in self.copied if pair not in self.stored]
+
+
+class InsertableTravelTimeMatrixTest(unittest.TestCase):
+    def setUp(self):
+        self.postGISServiceProvider = PostGISServiceProvider()
+        self.travelTimeMatrix = pd.DataFrame({
+            "ykr_from_id": [5785640, 5785640, 5785641, 5785641],
+            "ykr_to_id": [5793265, 5793266, 5793265, 5793265],
+            "travel_time": [10, 20, 30, 31]
+        })
+
+    def insertable(self, stored):
+        cursor = StoredPairsCursor(stored)
+        connection = mock.Mock()
+        connection.cursor.return_value = cursor
+        with mock.patch.object(PostGISServiceProvider, "getConnection", return_value=connection):
+            insertable = self.postGISServiceProvider.insertableTravelTimeMatrixGeoDataFrame(
+                travelTimeMatrix=self.travelTimeMatrix, tableName="matrix", column1="ykr_from_id",
+                column2="ykr_to_id")
+        connection.commit.assert_called_once_with()
+        connection.close.assert_called_once_with()
+        return insertable, cursor
+
+    def test_givenPairsAlreadyStored_then_removeTheirRows(self):
+        insertable, cursor = self.insertable(stored={(5785640., 5793265.), (5785641., 5793265.)})
+
+        self.assertListEqual([20], insertable["travel_time"].tolist())
+        # Every distinct pair is copied once and anti-joined with the table on the server
+        self.assertEqual(3, len(cursor.copied))
+        self.assertIn("NOT EXISTS", cursor.statements[-1])
+        self.assertIn("FROM matrix AS matrix", cursor.statements[-1])
+
+    def test_givenNewPairs_then_keepEveryRow(self):
+        insertable, cursor = self.insertable(stored=set())
+
+        self.assertListEqual([10, 20, 30, 31], insertable["travel_time"].tolist())
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import Point
+
+from codes.src.matrixStore.AccessibilitySummary import summarizeTravelTimeMatrixStore, \
+    summarizeTravelTimeMatrixFiles, joinSummaryToGrid
+from codes.src.matrixStore.TravelTimeMatrixStore import compileTravelTimeMatrixStore
+from codes.src.matrixStore.YKRIndex import YKRIndex
+from codes.test.matrixStore import writeMatrixFolder
+
+
+class AccessibilitySummaryTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.matrixFolder = os.path.join(self.dir, "matrix")
+        self.storeFolder = os.path.join(self.dir, "store")
+        self.ykrIds = [5785640, 5785641, 5787544]
+
+        # Travel times to each destination from the three origins
+        self.travelTimes = {
+            5785640: [0, 20, 40],
+            5785641: [10, 0, -1],
+            5787544: [-1, -1, -1]
+        }
+        writeMatrixFolder(self.matrixFolder, {
+            to_id: pd.DataFrame({"from_id": self.ykrIds, "to_id": to_id, "pt_r_t": times,
+                                 "pt_r_d": [time * 100 if time >= 0 else -1 for time in times]})
+            for to_id, times in self.travelTimes.items()
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_givenAStore_then_summarizeEveryDestination(self):
+        store = compileTravelTimeMatrixStore(self.matrixFolder, self.storeFolder)
+
+        summary = summarizeTravelTimeMatrixStore(store, by="to_id", columns=["pt_r_t", "pt_r_d"], blockSize=2)
+
+        self.assertListEqual(self.ykrIds, summary["to_id"].tolist())
+        self.assertListEqual([3, 2, 0], summary["pt_r_t_count"].tolist())
+        self.assertListEqual([20.0, 5.0], summary["pt_r_t_median"].tolist()[:2])
+        self.assertListEqual([20.0, 5.0], summary["pt_r_t_mean"].tolist()[:2])
+        self.assertListEqual([10.0, 2.5], summary["pt_r_t_q25"].tolist()[:2])
+        self.assertListEqual([2, 2, 0], summary["pt_r_t_le30"].tolist())
+        self.assertTrue(np.isnan(summary["pt_r_t_median"].iloc[2]))
+        self.assertListEqual([2000.0, 500.0], summary["pt_r_d_median"].tolist()[:2])
+        self.assertNotIn("pt_r_d_le30", summary.columns)
+
+    def test_givenAStore_then_summarizeEveryOrigin(self):
+        store = compileTravelTimeMatrixStore(self.matrixFolder, self.storeFolder)
+
+        summary = summarizeTravelTimeMatrixStore(store, by="from_id", columns=["pt_r_t"], blockSize=2)
+
+        self.assertListEqual(self.ykrIds, summary["from_id"].tolist())
+        self.assertListEqual([2, 2, 1], summary["pt_r_t_count"].tolist())
+        self.assertListEqual([5.0, 10.0, 40.0], summary["pt_r_t_median"].tolist())
+        self.assertListEqual([2, 2, 0], summary["pt_r_t_le30"].tolist())
+
+    def test_givenMatrixFiles_then_summarizeLikeTheStore(self):
+        store = compileTravelTimeMatrixStore(self.matrixFolder, self.storeFolder)
+        files = YKRIndex.build(matrixFolder=self.matrixFolder).getFiles(self.ykrIds)
+
+        fromFiles = summarizeTravelTimeMatrixFiles(files, jobs=2)
+        self.assertListEqual(["to_id", "pt_r_t_count"], fromFiles.columns.tolist()[:2])
+        fromStore = summarizeTravelTimeMatrixStore(store, by="to_id", columns=["pt_r_t", "pt_r_d"])
+
+        pd.testing.assert_frame_equal(fromStore, fromFiles, check_dtype=False)
+
+    def test_givenTheGrid_then_joinBothDirections(self):
+        store = compileTravelTimeMatrixStore(self.matrixFolder, self.storeFolder)
+        grid = gpd.GeoDataFrame({"YKR_ID": self.ykrIds + [1]}, geometry=[Point(x, 0) for x in range(4)],
+                                crs="EPSG:3067")
+
+        joined = joinSummaryToGrid(grid, summarizeTravelTimeMatrixStore(store, by="to_id", columns=["pt_r_t"]),
+                                   prefix="to_")
+        joined = joinSummaryToGrid(joined, summarizeTravelTimeMatrixStore(store, by="from_id", columns=["pt_r_t"]),
+                                   prefix="from_")
+
+        self.assertIsInstance(joined, gpd.GeoDataFrame)
+        self.assertListEqual(self.ykrIds + [1], joined["YKR_ID"].tolist())
+        self.assertNotIn("to_id", joined.columns)
+        self.assertListEqual([20.0, 5.0], joined["to_pt_r_t_median"].tolist()[:2])
+        self.assertListEqual([5.0, 10.0, 40.0], joined["from_pt_r_t_median"].tolist()[:3])
+        self.assertTrue(np.isnan(joined["from_pt_r_t_median"].iloc[3]))
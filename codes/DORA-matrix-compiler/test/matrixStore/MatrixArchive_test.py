@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from codes.src.comparison.SelectFiles_tools import selectIdsQueryArchive
+from codes.src.matrixStore.MatrixArchive import compileTravelTimeMatrixArchive, MatrixArchive, CODEC_ZLIB
+from codes.test.matrixStore import writeMatrixFolder
+
+
+class MatrixArchiveTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.matrixFolder = os.path.join(self.dir, "matrix")
+        self.archivePath = os.path.join(self.dir, "archive", "travel_time_matrix.ttma")
+
+        self.contents = {to_id: "from_id;to_id;walk_t\n5785640;%s;10\n5785641;%s;-1\n" % (to_id, to_id)
+                         for to_id in [5787544, 5785640, 5785641]}
+        writeMatrixFolder(self.matrixFolder, self.contents)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_givenAMatrixFolder_then_readAnyDestinationFromTheArchive(self):
+        compileTravelTimeMatrixArchive(self.matrixFolder, self.archivePath)
+
+        archive = MatrixArchive(self.archivePath)
+
+        self.assertEqual(3, len(archive))
+        self.assertListEqual([5785640, 5785641, 5787544], archive.ids.tolist())
+        for to_id, content in self.contents.items():
+            self.assertEqual(content.encode("utf-8"), archive.readBytes(to_id))
+        self.assertListEqual([10, -1], archive.read(5787544)["walk_t"].tolist())
+        self.assertNotIn(1, archive)
+        self.assertRaises(KeyError, archive.readBytes, 1)
+
+    def test_givenAZlibArchive_then_selectTheOriginsOfTheDestinations(self):
+        compileTravelTimeMatrixArchive(self.matrixFolder, self.archivePath, codec=CODEC_ZLIB)
+
+        selection = selectIdsQueryArchive(self.archivePath, [5787544, 1, 5785640], [5785641], searchColumn="from_id",
+                                          sep=";")
+
+        self.assertListEqual([5787544, 5785640], selection["to_id"].tolist())
+        self.assertListEqual([-1, -1], selection["walk_t"].tolist())
@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pyarrow.parquet as pq
+
+from codes.src.comparison.Comparison import Comparison
+from codes.src.matrixStore.TravelTimeMatrixParquet import compileTravelTimeMatrixParquet
+from codes.test.matrixStore import writeMatrixFolder
+
+
+class TravelTimeMatrixParquetTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.matrixFolder = os.path.join(self.dir, "matrix")
+        self.datasetFolder = os.path.join(self.dir, "parquet")
+
+        writeMatrixFolder(self.matrixFolder, {
+            to_id: "from_id;to_id;walk_t;walk_d;car_r_t\n"
+                   "5785641;%s;20;1500;-1\n"
+                   "5785640;%s;10;%s;5\n" % (to_id, to_id, to_id % 100)
+            for to_id in [5787544, 5785640, 5785641]
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_givenAMatrixFolder_then_writeOnePartitionPerDestinationRange(self):
+        files = compileTravelTimeMatrixParquet(self.matrixFolder, self.datasetFolder, rowGroupSize=2)
+
+        self.assertListEqual(["to_id_range=5785", "to_id_range=5787"],
+                             sorted(os.path.basename(os.path.dirname(file)) for file in files))
+
+        metadata = pq.ParquetFile(files[0]).metadata
+        self.assertEqual(2, metadata.num_row_groups)
+        fromIdIndex = metadata.schema.names.index("from_id")
+        statistics = [metadata.row_group(i).column(fromIdIndex).statistics for i in range(metadata.num_row_groups)]
+        self.assertListEqual([(5785640, 5785640), (5785641, 5785641)], [(s.min, s.max) for s in statistics])
+
+    def test_givenOriginsAndDestinations_then_readOnlyTheirTravelTimes(self):
+        compileTravelTimeMatrixParquet(self.matrixFolder, self.datasetFolder, rowGroupSize=2)
+
+        subset = Comparison().loadTravelTimeMatrixParquetSubset(self.datasetFolder, originIDs=[5785640],
+                                                                destinationIDs=[5787544, 5785641, 1],
+                                                                columns=["walk_d", "car_r_t"])
+        subset = subset.sort_values("to_id").reset_index(drop=True)
+
+        self.assertListEqual(["from_id", "to_id", "walk_d", "car_r_t"], subset.columns.tolist())
+        self.assertListEqual([5785641, 5787544], subset["to_id"].tolist())
+        self.assertListEqual([41, 44], subset["walk_d"].tolist())
+        self.assertEqual("int32", str(subset["walk_d"].dtype))
+        self.assertEqual("int16", str(subset["car_r_t"].dtype))
+
+        everything = Comparison().loadTravelTimeMatrixParquetSubset(self.datasetFolder)
+        self.assertEqual(6, len(everything))
+        self.assertListEqual(["from_id", "to_id", "walk_t", "walk_d", "car_r_t"], everything.columns.tolist())
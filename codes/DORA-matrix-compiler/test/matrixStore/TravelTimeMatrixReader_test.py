@@ -0,0 +1,49 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from codes.src.matrixStore import TravelTimeMatrixReader as readerModule
+from codes.src.matrixStore.TravelTimeMatrixReader import TravelTimeMatrixReader, readValueColumns
+from codes.test.matrixStore import writeMatrixFolder
+
+
+class TravelTimeMatrixReaderTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        files = writeMatrixFolder(self.dir, {
+            to_id: "from_id;to_id;walk_t;walk_d;pt_r_t\n" +
+                   "".join("%s;%s;%s;%s;-1\n" % (from_id, to_id, from_id % 100, 100000 + from_id % 100)
+                           for from_id in [5785640, 5785641, 5787544])
+            for to_id in [5785640, 5787544]
+        })
+        self.files = list(files.values())
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_givenOriginsAndColumns_then_readOnlyTheMatchingRowsWithFixedDtypes(self):
+        selection = TravelTimeMatrixReader([5787544, 5785640], columns=["walk_d"]).readFiles(self.files, jobs=2)
+
+        self.assertListEqual(["from_id", "to_id", "walk_d"], list(selection.columns))
+        self.assertListEqual([5785640, 5787544, 5785640, 5787544], selection["from_id"].tolist())
+        self.assertListEqual([100040, 100044] * 2, selection["walk_d"].tolist())
+        self.assertEqual(np.int32, selection["walk_d"].dtype)
+
+    def test_givenNoColumns_then_readTheValueColumnsOfTheFileWithoutPyarrow(self):
+        pyarrow = readerModule.pa
+        readerModule.pa = None
+        try:
+            selection = TravelTimeMatrixReader([5785641]).read(self.files[0])
+        finally:
+            readerModule.pa = pyarrow
+
+        self.assertListEqual(["from_id", "to_id", "walk_t", "walk_d", "pt_r_t"], list(selection.columns))
+        self.assertListEqual([[5785641, 5785640, 41, 100041, -1]], selection.values.tolist())
+        self.assertEqual(np.int16, selection["pt_r_t"].dtype)
+        self.assertEqual(0, len(TravelTimeMatrixReader([1]).read(self.files[0])))
+
+    def test_givenAHeader_then_selectTheWantedValueColumnsInItsOrder(self):
+        self.assertListEqual(["walk_t", "walk_d", "pt_r_t"], readValueColumns(self.files[0]))
+        self.assertListEqual(["walk_d", "pt_r_t"], readValueColumns(self.files[0], columns=["pt_r_t", "walk_d", "x"]))
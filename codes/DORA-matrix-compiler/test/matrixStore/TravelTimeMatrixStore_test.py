@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from codes.src.matrixStore.TravelTimeMatrixStore import compileTravelTimeMatrixStore, TravelTimeMatrixStore, \
+    MATRIX_COLUMNS
+from codes.test.matrixStore import writeMatrixFolder
+
+
+class TravelTimeMatrixStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.matrixFolder = os.path.join(self.dir, "matrix")
+        self.storeFolder = os.path.join(self.dir, "store")
+        self.ykrIds = [5785640, 5785641, 5787544]
+
+        writeMatrixFolder(self.matrixFolder, {to_id: self.dummyTravelTimesTo(to_id) for to_id in self.ykrIds})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def dummyTravelTimesTo(self, to_id):
+        data = pd.DataFrame({"from_id": self.ykrIds, "to_id": to_id})
+        for column in MATRIX_COLUMNS[2:]:
+            if column.endswith("_d"):
+                data[column] = [abs(from_id - to_id) * 100 + 70000 for from_id in self.ykrIds]
+            else:
+                data[column] = [abs(from_id - to_id) % 1000 for from_id in self.ykrIds]
+        data.loc[data["from_id"] == self.ykrIds[0], "pt_r_t"] = -1
+        return data[MATRIX_COLUMNS]
+
+    def test_givenTravelTimeMatrixFiles_then_compileStore(self):
+        store = compileTravelTimeMatrixStore(travelTimeMatrixURL=self.matrixFolder, storeFolder=self.storeFolder)
+
+        self.assertListEqual(self.ykrIds, store.ids.tolist())
+        self.assertEqual(np.int16, store.getColumn("walk_t").dtype)
+        self.assertEqual(np.int32, store.getColumn("walk_d").dtype)
+        self.assertEqual((3, 3), store.getColumn("pt_r_t").shape)
+
+    def test_givenADestination_then_getTheSameValuesAsTheTextFile(self):
+        compileTravelTimeMatrixStore(travelTimeMatrixURL=self.matrixFolder, storeFolder=self.storeFolder)
+        store = TravelTimeMatrixStore(self.storeFolder)
+
+        to_id = self.ykrIds[1]
+        expected = self.dummyTravelTimesTo(to_id)
+        travelTimes = store.getTravelTimesTo(to_id)
+
+        self.assertListEqual(MATRIX_COLUMNS, list(travelTimes.columns))
+        for column in MATRIX_COLUMNS:
+            self.assertListEqual(expected[column].tolist(), travelTimes[column].tolist())
+
+    def test_givenAnOrigin_then_getItsTravelTimesToEveryDestination(self):
+        store = compileTravelTimeMatrixStore(travelTimeMatrixURL=self.matrixFolder, storeFolder=self.storeFolder)
+
+        from_id = self.ykrIds[0]
+        travelTimes = store.getTravelTimesFrom(from_id, columns=["pt_r_t", "walk_t"])
+
+        self.assertListEqual(["from_id", "to_id", "pt_r_t", "walk_t"], list(travelTimes.columns))
+        self.assertListEqual(self.ykrIds, travelTimes["to_id"].tolist())
+        self.assertListEqual([-1, -1, -1], travelTimes["pt_r_t"].tolist())
+        self.assertListEqual([0, 1, 904], travelTimes["walk_t"].tolist())
+
+    def test_givenOriginsAndDestinations_then_getTheSubset(self):
+        store = compileTravelTimeMatrixStore(travelTimeMatrixURL=self.matrixFolder, storeFolder=self.storeFolder)
+
+        subset = store.getSubset(fromIds=[5785641, 5787544], toIds=[5785640], columns=["walk_d"])
+
+        self.assertListEqual([5785641, 5787544], subset["from_id"].tolist())
+        self.assertListEqual([5785640, 5785640], subset["to_id"].tolist())
+        self.assertListEqual([70100, 260400], subset["walk_d"].tolist())
+
+    def test_givenAnUnknownYKRID_then_raiseKeyError(self):
+        store = compileTravelTimeMatrixStore(travelTimeMatrixURL=self.matrixFolder, storeFolder=self.storeFolder)
+
+        self.assertRaises(KeyError, store.getTravelTimesTo, 1)
@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from codes.src.matrixStore.YKRIndex import YKRIndex
+from codes.test.matrixStore import writeMatrixFolder
+
+
+class YKRIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.matrixFolder = os.path.join(self.dir, "matrix")
+        self.indexFolder = os.path.join(self.dir, "index")
+
+        writeMatrixFolder(self.matrixFolder, {to_id: "from_id;to_id\n" for to_id in [5787544, 5785640, 5785641]})
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_givenAMatrixFolder_then_indexTheFilesByYKRID(self):
+        ykrIndex = YKRIndex.build(matrixFolder=self.matrixFolder)
+
+        self.assertEqual(3, len(ykrIndex))
+        self.assertListEqual([5785640, 5785641, 5787544], ykrIndex.ids.tolist())
+        self.assertListEqual([0, 2], ykrIndex.getPositions([5785640, 5787544]).tolist())
+        self.assertEqual(os.path.join(self.matrixFolder, "5785xxx", "travel_times_to_5785641.txt"),
+                         ykrIndex.getFile(5785641))
+
+    def test_givenGridCellsWithoutFile_then_skipThemFromTheSelectedFiles(self):
+        ykrIndex = YKRIndex.build(ykrIds=[5785640, 5785641, 5787544, 5787545], matrixFolder=self.matrixFolder)
+
+        files = ykrIndex.getFiles([5787545, 5787544, 1, 5785640])
+
+        self.assertListEqual(["travel_times_to_5787544.txt", "travel_times_to_5785640.txt"],
+                             [os.path.basename(f) for f in files])
+        self.assertIsNone(ykrIndex.getFile(5787545))
+        self.assertIn(5787545, ykrIndex)
+        self.assertNotIn(1, ykrIndex)
+
+    def test_givenASavedIndex_then_loadItMemoryMapped(self):
+        YKRIndex.build(matrixFolder=self.matrixFolder).save(self.indexFolder)
+
+        ykrIndex = YKRIndex.load(self.indexFolder)
+
+        self.assertListEqual([5785640, 5785641, 5787544], ykrIndex.ids.tolist())
+        self.assertEqual(os.path.join(self.matrixFolder, "5787xxx", "travel_times_to_5787544.txt"),
+                         ykrIndex.getFile(5787544))
+        self.assertRaises(KeyError, ykrIndex.getPositions, [1])
+
+    def test_givenPlainIds_then_indexTheFirstPathOfEachId(self):
+        ykrIndex = YKRIndex.fromIds([5787544, 5785640, 5787544], ["b.txt", "", "c.txt"], root=self.dir)
+
+        self.assertListEqual([5785640, 5787544], ykrIndex.ids.tolist())
+        self.assertEqual(os.path.join(self.dir, "b.txt"), ykrIndex.getFile(5787544))
+        self.assertIsNone(ykrIndex.getFile(5785640))
+        self.assertListEqual([], YKRIndex.fromIds([5785640]).getFiles([5785640]))
@@ -0,0 +1,26 @@
+import os
+
+
+def writeMatrixFolder(matrixFolder, travelTimes, sep=";"):
+    """
+    Write fake travel time matrix files in the "<4 digits>xxx/travel_times_to_<YKR_ID>.txt" layout of the matrix.
+
+    :param matrixFolder: Root folder of the matrix.
+    :param travelTimes: Dictionary destination YKR_ID -> DataFrame or text of its file.
+    :param sep: Separator of the DataFrame files.
+    :return: Dictionary destination YKR_ID -> path of its file.
+    """
+    files = {}
+    for to_id, data in travelTimes.items():
+        targetDir = os.path.join(matrixFolder, "%sxxx" % str(to_id)[:4])
+        if not os.path.isdir(targetDir):
+            os.makedirs(targetDir)
+
+        filepath = os.path.join(targetDir, "travel_times_to_%s.txt" % to_id)
+        if isinstance(data, str):
+            with open(filepath, 'w+') as outfile:
+                outfile.write(data)
+        else:
+            data.to_csv(filepath, sep=sep, index=False)
+        files[to_id] = filepath
+    return files
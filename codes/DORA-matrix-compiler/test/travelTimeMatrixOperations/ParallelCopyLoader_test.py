@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+import zipfile
+from unittest import mock
+
+from codes.src.connection.PostgresServiceProvider import PostGISServiceProvider
+from codes.src.exceptions import NotUploadedTravelTimeMatrixException
+from codes.src.travelTimeMatrixOperations.ParallelCopyLoader import ParallelCopyLoader, getZipFile
+
+
+class ParallelCopyLoaderTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = os.getcwd()
+        self.postGISServiceProvider = PostGISServiceProvider()
+        self.bicycleTravelTimeMatrix = "bicycle_travel_time_matrix"
+        self.columns = ("ykr_from_id", "ykr_to_id", "travel_time")
+
+    def test_givenAZipFile_then_uploadItsMembersInParallel(self):
+        zippath = self.dir + "%data%testData%summary_csv5.zip".replace("%", os.sep)
+        outputFolder = self.dir + "%data%outputData%parallelUpload".replace("%", os.sep)
+        tableName = "cardat_fast_" + self.bicycleTravelTimeMatrix + ""
+
+        parallelCopyLoader = ParallelCopyLoader(postGISServiceProvider=self.postGISServiceProvider, jobs=4)
+        uploadedMembers = parallelCopyLoader.load(zippath, tableName, self.columns, outputFolder)
+
+        self.assertGreater(len(uploadedMembers), 0)
+
+        # The second run resumes from the progress file and has nothing left to upload
+        self.assertListEqual([], parallelCopyLoader.load(zippath, tableName, self.columns, outputFolder))
+
+    def test_givenAZipFile_then_uploadItsMembersThroughStagingTables(self):
+        zippath = self.dir + "%data%testData%summary_csv5.zip".replace("%", os.sep)
+        outputFolder = self.dir + "%data%outputData%stagingUpload".replace("%", os.sep)
+        tableName = "cardat_fast_" + self.bicycleTravelTimeMatrix + ""
+
+        parallelCopyLoader = ParallelCopyLoader(postGISServiceProvider=self.postGISServiceProvider, jobs=4,
+                                                staging=True)
+        uploadedMembers = parallelCopyLoader.load(zippath, tableName, self.columns, outputFolder)
+
+        self.assertGreater(len(uploadedMembers), 0)
+
+
+class ParallelCopyLoaderProgressTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.members = ["a.csv", "b.csv", "c.csv"]
+        self.zippath = os.path.join(self.dir, "summary.zip")
+        with zipfile.ZipFile(self.zippath, 'w') as zip_ref:
+            for member in self.members:
+                zip_ref.writestr(member, "1,2,3\n")
+        self.outputFolder = os.path.join(self.dir, "output")
+        self.postGISServiceProvider = mock.Mock()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_givenAnInterruptedUpload_then_resumeFromTheMembersAlreadyCopied(self):
+        parallelCopyLoader = ParallelCopyLoader(postGISServiceProvider=self.postGISServiceProvider, jobs=2,
+                                                backend="threading", staging=True)
+
+        # The upload is interrupted while the third member is being appended into the target table
+        self.postGISServiceProvider.attachStagingTable.side_effect = [True, True, KeyboardInterrupt()]
+        with mock.patch("codes.src.travelTimeMatrixOperations.ParallelCopyLoader.uploadZipMember",
+                        side_effect=lambda zippath, member, *args: (member, None)):
+            self.assertRaises(KeyboardInterrupt, parallelCopyLoader.load, self.zippath, "matrix", ("a", "b", "c"),
+                              self.outputFolder)
+
+        progressFile = parallelCopyLoader.getProgressFile(self.zippath, self.outputFolder)
+        uploadedMembers = parallelCopyLoader.readUploadedMembers(progressFile)
+        self.assertEqual(2, len(uploadedMembers))
+        remainingMember = ({"a.csv", "b.csv", "c.csv"} - uploadedMembers).pop()
+
+        self.postGISServiceProvider.attachStagingTable.side_effect = None
+        with mock.patch("codes.src.travelTimeMatrixOperations.ParallelCopyLoader.uploadZipMember",
+                        side_effect=lambda zippath, member, *args: (member, None)) as upload:
+            self.assertListEqual([remainingMember], parallelCopyLoader.load(self.zippath, "matrix", ("a", "b", "c"),
+                                                                            self.outputFolder))
+            upload.assert_called_once_with(self.zippath, remainingMember,
+                                           "matrix_staging_%s" % "abc".index(remainingMember[0]), ("a", "b", "c"),
+                                           "matrix")
+
+    def test_givenFailuresFinishingOutOfOrder_then_reportThemInZipOrder(self):
+        self.members = ["a.csv", "b.csv", "c.csv", "d.csv"]
+        with zipfile.ZipFile(self.zippath, 'w') as zip_ref:
+            for member in self.members:
+                zip_ref.writestr(member, "1,2,3\n")
+
+        def failLaterMembersFirst(zippath, member, *args):
+            time.sleep(0.1 * (len(self.members) - self.members.index(member)))
+            return member, "COPY was not executed"
+
+        parallelCopyLoader = ParallelCopyLoader(postGISServiceProvider=self.postGISServiceProvider, jobs=4,
+                                                backend="threading")
+        with mock.patch("codes.src.travelTimeMatrixOperations.ParallelCopyLoader.uploadZipMember",
+                        side_effect=failLaterMembersFirst):
+            with self.assertRaises(NotUploadedTravelTimeMatrixException) as context:
+                parallelCopyLoader.load(self.zippath, "matrix", ("a", "b", "c"), self.outputFolder)
+
+        self.assertIn("a.csv, b.csv, c.csv, d.csv", str(context.exception))
+
+    def test_givenTheSameZipFile_then_reuseTheHandleOfTheThread(self):
+        zip_ref = getZipFile(self.zippath)
+        self.assertIs(zip_ref, getZipFile(self.zippath))
+
+        time.sleep(0.01)
+        with zipfile.ZipFile(self.zippath, 'w') as rewritten:
+            rewritten.writestr("e.csv", "1,2,3\n")
+        self.assertListEqual(["e.csv"], getZipFile(self.zippath).namelist())
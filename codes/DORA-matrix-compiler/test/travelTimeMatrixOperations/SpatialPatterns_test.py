@@ -106,3 +106,24 @@ class SpatialPatternsTest(unittest.TestCase):
                         os.remove(f)
 
                     self.assertTrue(isExecuted)
+
+    def test_givenAZipFile_then_streamItsMembersIntoTheTable(self):
+        zippath = self.dir + "%data%testData%summary_csv5.zip".replace("%", os.sep)
+
+        columns = ("ykr_from_id", "ykr_to_id", "travel_time")
+        tableName = "cardat_fast_" + self.bicycleTravelTimeMatrix + ""
+
+        with zipfile.ZipFile(zippath, 'r') as zip_ref:
+            for member in zip_ref.namelist():
+                isExecuted = self.spatialPatter.insertZipMember(zip_ref, member, tableName, columns)
+                self.assertTrue(isExecuted)
+
+    def test_givenTargets_then_exportTheFeaturesBuiltByPostGIS(self):
+        outputFolder = self.dir + "%data%outputData%serverSide".replace("%", os.sep)
+
+        exportedFiles = self.spatialPatter.exportTravelTimeMatrices(ykrids=[5793265, 1], tableName=self.testTableName,
+                                                                   directionality="TO", outputFolder=outputFolder)
+
+        self.assertEqual(2, len(exportedFiles))
+        for f in exportedFiles:
+            self.assertTrue(os.path.exists(f))
@@ -1,8 +1,10 @@
 import unittest
+from unittest import mock
 
 import os
 
-from codes.src.travelTimeMatrix import runTravelTimeMatrixOperations
+from codes.src.exceptions import NotParameterGivenException
+from codes.src.travelTimeMatrix import main, runTravelTimeMatrixOperations
 
 
 class TravelTimeMatrixTest(unittest.TestCase):
@@ -27,3 +29,11 @@ class TravelTimeMatrixTest(unittest.TestCase):
         directionality = "TO"
         targets = "5793265,5793266"
         runTravelTimeMatrixOperations(querying, uploading, outputFolder, zippath, directionality, targets)
+
+    def test_givenAnUnknownFormat_then_raiseNotParameterGivenException(self):
+        argv = ["travelTimeMatrix", "--query", "-o", "outputFolder", "-t", "5793265", "-f", "shapefile"]
+        with mock.patch("sys.argv", argv), \
+                mock.patch("codes.src.travelTimeMatrix.runTravelTimeMatrixOperations") as runOperations, \
+                mock.patch("codes.src.travelTimeMatrix.printHelp"):
+            self.assertRaises(NotParameterGivenException, main)
+            runOperations.assert_not_called()
@@ -0,0 +1,35 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from codes.src.util import Configuration, getConfigurationProperties, getResourcePath
+
+
+class ConfigurationTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.configurationPath = os.path.join(self.dir, "configuration.properties")
+        with open(self.configurationPath, 'w+') as outfile:
+            outfile.write("[DATABASE_CONFIG]\nhost=localhost\nport=5432\n")
+
+    def tearDown(self):
+        os.environ.pop("DORA_DATABASE_CONFIG__host", None)
+        Configuration.reload()
+        shutil.rmtree(self.dir)
+
+    def test_givenNoWorkingDirectory_then_readTheConfigurationOfThePackage(self):
+        self.assertTrue(os.path.isfile(getResourcePath("configuration.properties")))
+        self.assertIs(Configuration.getInstance(), Configuration.getInstance())
+        self.assertIn("jobs", getConfigurationProperties(section="PARALLELIZATION"))
+
+    def test_givenAnEnvironmentVariable_then_overrideThePropertyAfterReload(self):
+        Configuration.reload(self.configurationPath)
+        self.assertEqual("localhost", getConfigurationProperties(section="DATABASE_CONFIG")["host"])
+
+        os.environ["DORA_DATABASE_CONFIG__host"] = "db.example.org"
+        self.assertEqual("localhost", getConfigurationProperties(section="DATABASE_CONFIG")["host"])
+
+        Configuration.reload(self.configurationPath)
+        self.assertEqual("db.example.org", getConfigurationProperties(section="DATABASE_CONFIG")["host"])
+        self.assertEqual("5432", getConfigurationProperties(section="DATABASE_CONFIG")["port"])
@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+from shapely.geometry import Point
+
+from codes.src.connection.PostgresServiceProvider import PostGISServiceProvider
+from codes.src.util import FileActions, GeojsonStreamWriter, GPD_CRS
+
+
+class FileActionsTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fileActions = FileActions()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_givenAGeoDataFrame_then_streamTheSameGeojsonThanConvertToGeojson(self):
+        data = {
+            'ykr_from_id': pd.Series([5785640, 5785641, 5787544]),
+            'ykr_to_id': pd.Series([5793265, 5793265, 5793265]),
+            'travel_time': pd.Series([20.5, np.nan, 40.])
+        }
+        geometries = [Point(2793620.4483544305, 8460782.78014875), Point(2748951.962723606, 8424743.938335517),
+                      Point(2748951.0, 8424743.0)]
+        geodataframe = gpd.GeoDataFrame(pd.DataFrame(data), crs=GPD_CRS.PSEUDO_MERCATOR, geometry=geometries)
+
+        fileURL = self.fileActions.writeGeojson(folderPath=self.dir, filename="streamed.geojson",
+                                                geodataframe=geodataframe)
+
+        with open(fileURL) as f:
+            streamed = json.load(f)
+        expected = PostGISServiceProvider().convertToGeojson(geodataframe)
+
+        self.assertDictEqual(expected, streamed)
+
+    def test_givenAnEmptyGeoDataFrame_then_writeAnEmptyFeatureCollection(self):
+        geodataframe = gpd.GeoDataFrame(pd.DataFrame({'travel_time': []}), crs=GPD_CRS.PSEUDO_MERCATOR, geometry=[])
+
+        fileURL = self.fileActions.writeGeojson(folderPath=os.path.join(self.dir, "empty"), filename="empty.geojson",
+                                                geodataframe=geodataframe)
+
+        with open(fileURL) as f:
+            streamed = json.load(f)
+
+        self.assertEqual("FeatureCollection", streamed["type"])
+        self.assertListEqual([], streamed["features"])
+        self.assertEqual("urn:ogc:def:crs:epsg::3857", streamed["crs"]["properties"]["name"])
+
+    def test_givenSmallChunks_then_streamTheSameFeatures(self):
+        data = {'ykr_from_id': pd.Series(range(5)), 'travel_time': pd.Series([1., np.nan, 3., 4., 5.])}
+        geodataframe = gpd.GeoDataFrame(pd.DataFrame(data), crs=GPD_CRS.PSEUDO_MERCATOR,
+                                        geometry=[Point(x, x) for x in range(5)])
+
+        contents = []
+        for chunkSize in [2, 10]:
+            fileURL = os.path.join(self.dir, "chunks_%s.geojson" % chunkSize)
+            with GeojsonStreamWriter(fileURL) as writer:
+                writer.writeGeoDataFrame(geodataframe, chunkSize=chunkSize)
+            self.assertEqual(5, writer.featureCount)
+            with open(fileURL) as f:
+                contents.append(f.read())
+
+        self.assertEqual(contents[1], contents[0])
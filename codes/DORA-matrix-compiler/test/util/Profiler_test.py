@@ -0,0 +1,88 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from codes.src.util import Configuration, Profiler, dgl_timer
+
+
+@dgl_timer
+def timedFunction(value):
+    return value * 2
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        Profiler.reset()
+
+    def tearDown(self):
+        os.environ.pop("DORA_WFS_CONFIG__timerEnabled", None)
+        os.environ.pop("DORA_WFS_CONFIG__timerOutput", None)
+        Configuration.reload()
+        Profiler.reset()
+        shutil.rmtree(self.dir)
+
+    def test_givenATimedFunction_then_aggregateItsLatencies(self):
+        for value in range(10):
+            self.assertEqual(value * 2, timedFunction(value))
+
+        with Profiler.measure("block"):
+            timedFunction(1)
+
+        statistics = Profiler.getStatistics()
+        timed = statistics["%s.timedFunction" % __name__]
+
+        self.assertEqual(11, timed["count"])
+        self.assertEqual(1, statistics["block"]["count"])
+        self.assertLessEqual(timed["min_ms"], timed["p95_ms"])
+        self.assertLessEqual(timed["p95_ms"], timed["max_ms"])
+
+    def test_givenTheStatistics_then_dumpThemAsJsonAndCsv(self):
+        timedFunction(1)
+        name = "%s.timedFunction" % __name__
+
+        with open(Profiler.dump(os.path.join(self.dir, "profile.json"))) as f:
+            self.assertEqual(1, json.load(f)[name]["count"])
+
+        with open(Profiler.dump(os.path.join(self.dir, "profile.csv"))) as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(name, rows[0]["function"])
+        self.assertEqual("1", rows[0]["count"])
+
+    def test_givenTheTimersDisabledAfterImport_then_stopRecording(self):
+        os.environ["DORA_WFS_CONFIG__timerEnabled"] = "False"
+        Configuration.reload()
+        self.assertEqual(2, timedFunction(1))
+        self.assertDictEqual({}, Profiler.getStatistics())
+
+        os.environ["DORA_WFS_CONFIG__timerEnabled"] = "True"
+        Configuration.reload()
+        timedFunction(1)
+        self.assertEqual(1, Profiler.getStatistics()["%s.timedFunction" % __name__]["count"])
+
+    def test_givenTheConfigurationLoaded_then_checkOnlyTheCachedFlag(self):
+        os.environ["DORA_WFS_CONFIG__timerEnabled"] = "False"
+        Configuration.reload()
+        with mock.patch("codes.src.util.getConfigurationProperties", side_effect=AssertionError):
+            self.assertEqual(2, timedFunction(1))
+            with Profiler.measure("block"):
+                pass
+        self.assertDictEqual({}, Profiler.getStatistics())
+
+    def test_givenAWorkerProcess_then_dumpIntoItsOwnFile(self):
+        timerOutput = os.path.join(self.dir, "profile.json")
+        os.environ["DORA_WFS_CONFIG__timerOutput"] = timerOutput
+        Configuration.reload()
+        timedFunction(1)
+
+        with mock.patch("os.getpid", return_value=1):
+            Profiler.dumpAtExit()
+        self.assertTrue(os.path.isfile(os.path.join(self.dir, "profile_1.json")))
+        self.assertFalse(os.path.isfile(timerOutput))
+
+        Profiler.dumpAtExit()
+        self.assertTrue(os.path.isfile(timerOutput))
@@ -1,9 +1,18 @@
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 import os, sys
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
 import psycopg2
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
+from base import POSTGIS_DB_NAME, IP_ADDRESS, POSTGIS_PORT, POSTGIS_USERNAME, POSTGIS_PWD, DATA_TABLE
+# DORA-matrix-compiler importable as 'codes' (as when running 'python -m codes')
+from codes.src.matrixStore.YKRIndex import YKRIndex
 
 Base = declarative_base()
 
@@ -15,7 +24,7 @@ def connect_to_DB(host, db_name, username, pwd, port):
     return(conn, cursor)
 
 def create_DB_engine(host, db_name, username, pwd, port):
-    db_url = r'postgresql://%s:%s@%s:%s/%s' % (username, pwd, host, port, db_name)
+    db_url = r'postgresql+psycopg2://%s:%s@%s:%s/%s' % (username, pwd, host, port, db_name)
     engine = create_engine(db_url)
     return engine
 
@@ -27,18 +36,58 @@ def filePathsToList(source_dir, criteria, fileformat):
                 flist.append(os.path.join(root, filename))
     return flist
 
-def findMatchingFile(Walk_fp, targetPaths, mode='pt'):
-    search_folder = os.path.dirname(targetPaths[0])
-    Walk_ID = os.path.basename(Walk_fp).split('_')[0]
-    for targetfile in targetPaths:
-        if mode == 'car':
-            target_ID = os.path.basename(targetfile).split('_')[2]
-        else:
-            target_ID = os.path.basename(targetfile).split('_')[0]
-        if target_ID == Walk_ID:
-            return targetfile
-    print("Error: Could not find corresponding target_file for %s in %s" % (Walk_ID, search_folder))
-    sys.exit()
+# Travel modes of the input matrices, the walk matrix drives the compilation
+MODES = ['walk', 'pt_r', 'pt_m', 'car_r', 'car_m', 'bike_f', 'bike_s']
+
+def inputFileID(fp, mode):
+    # DORA car results have the ID as third part of the name, the other matrices as the first one
+    if mode.startswith('car'):
+        return os.path.basename(fp).split('_')[2]
+    return os.path.basename(fp).split('_')[0]
+
+def buildInputIndex(paths):
+    """Index the input matrices of every mode once by ID: mode -> YKRIndex of the paths.
+
+    Returns the indexes and a coverage report with the walk IDs lacking some mode ('missing'), the IDs with several
+    files of the same mode ('duplicates', the first path in sorted order is used) and the IDs without walk matrix
+    ('orphans')."""
+    indexes = {}
+    duplicates = {}
+    for mode in MODES:
+        mode_paths = sorted(paths[mode])
+        ids = np.array([int(inputFileID(fp, mode)) for fp in mode_paths], dtype=np.int32)
+        indexes[mode] = YKRIndex.fromIds(ids, mode_paths)
+
+        unique_ids, counts = np.unique(ids, return_counts=True)
+        for ID in unique_ids[counts > 1].tolist():
+            duplicates.setdefault(str(ID), {})[mode] = [mode_paths[position]
+                                                         for position in np.flatnonzero(ids == ID).tolist()]
+
+    walk = indexes['walk']
+    found = {mode: indexes[mode].lookup(walk.ids)[0] for mode in MODES}
+    missing = {}
+    for position, ID in enumerate(walk.ids.tolist()):
+        missing_modes = [mode for mode in MODES if not found[mode][position]]
+        if missing_modes:
+            missing[str(ID)] = missing_modes
+    orphans = np.unique(np.concatenate([np.asarray(index.ids[~walk.lookup(index.ids)[0]])
+                                        for index in indexes.values()]))
+
+    report = {
+        'missing': missing,
+        'duplicates': duplicates,
+        'orphans': [str(ID) for ID in orphans.tolist()]
+    }
+    return indexes, report
+
+def matrixInputs(indexes, matrix_id):
+    """Input matrix of every mode of 'matrix_id' found from the indexes of 'buildInputIndex': mode -> path."""
+    inputs = {}
+    for mode in MODES:
+        fp = indexes[mode].getFile(int(matrix_id))
+        if fp is not None:
+            inputs[mode] = fp
+    return inputs
 
 def processMatrix(fp, columns, names, nodata_value, columns_to_round):
     # Read data
@@ -74,25 +123,178 @@ def process_dora(fp, columns, names, columns_to_round):
     data.columns = names
     return data
 
-# ============
-# PARAMETERS
-# ============
+# --------------------
+# CHECKPOINT MANIFEST
+# --------------------
+
+def fileSignature(fp, previous=None):
+    """Size, modification time and SHA-1 of the file. The hash is reused from 'previous' if size and mtime are unchanged."""
+    stat = os.stat(fp)
+    signature = {'path': fp, 'size': stat.st_size, 'mtime': stat.st_mtime}
+    if previous is not None and previous.get('size') == signature['size'] and previous.get('mtime') == signature['mtime']:
+        signature['sha1'] = previous['sha1']
+        return signature
+    sha1 = hashlib.sha1()
+    with open(fp, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    signature['sha1'] = sha1.hexdigest()
+    return signature
+
+def loadManifest(manifest_fp):
+    if not os.path.exists(manifest_fp):
+        return {}
+    with open(manifest_fp) as f:
+        return json.load(f)
+
+def saveManifest(manifest, manifest_fp):
+    # Write to a temporary file first so a crash never leaves a truncated manifest behind
+    tmp_fp = manifest_fp + '.tmp'
+    with open(tmp_fp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_fp, manifest_fp)
+
+def inputSignatures(inputs, entry):
+    previous = entry.get('inputs', {}) if entry else {}
+    return {mode: fileSignature(fp, previous.get(mode)) for mode, fp in inputs.items()}
+
+def isCompleted(entry, signatures):
+    """True if the matrix was written by an earlier run from inputs with the same content."""
+    if not entry or entry.get('status') != 'completed':
+        return False
+    previous = entry.get('inputs', {})
+    return set(previous) == set(signatures) and \
+        all(previous[mode]['sha1'] == signatures[mode]['sha1'] for mode in signatures)
+
+# --------------------
+# ALIGNED ASSEMBLY
+# --------------------
+
+def alignModeMatrices(frames, columns):
+    """Combine the travel mode matrices by scattering their values into preallocated (from, to) arrays.
+
+    The grid is given by the first frame (walk). Like the chained inner merges, only the pairs found in every frame
+    are kept, and a column given by several frames (e.g. 'bike_d') takes its values from the first one. Columns that
+    no frame provides are filled with -1 (NoData).
+    """
+    from_ids = np.unique(frames[0]['from_id'].values)
+    to_ids = np.unique(frames[0]['to_id'].values)
+    shape = (len(from_ids), len(to_ids))
+    if len(from_ids) == 0:
+        return pd.DataFrame(columns=columns)
+
+    values = {column: np.full(shape, -1, dtype=np.float64) for column in columns[2:]}
+    filled = set()
+    coverage = np.zeros(shape, dtype=np.int8)
 
-POSTGIS_DB_NAME='matrix'
-IP_ADDRESS='xx.xx.xx.xx' 
-POSTGIS_PORT=5432 
-POSTGIS_USERNAME='myusername' 
-POSTGIS_PWD='mypwd'
-DATA_TABLE='travel_time_matrix_2018'
+    for frame in frames:
+        from_pos = np.searchsorted(from_ids, frame['from_id'].values).clip(max=len(from_ids) - 1)
+        to_pos = np.searchsorted(to_ids, frame['to_id'].values).clip(max=len(to_ids) - 1)
+        on_grid = (from_ids[from_pos] == frame['from_id'].values) & (to_ids[to_pos] == frame['to_id'].values)
+        from_pos, to_pos = from_pos[on_grid], to_pos[on_grid]
 
-# PostGIS Authentication crecedentials
-db_name, host, port, username, pwd = POSTGIS_DB_NAME, IP_ADDRESS, POSTGIS_PORT, POSTGIS_USERNAME, POSTGIS_PWD
+        # Count each pair once per frame, even if the frame has it several times
+        present = np.zeros(shape, dtype=bool)
+        present[from_pos, to_pos] = True
+        coverage += present
 
-# Create connection to Database (i.e. engine)
-engine = create_DB_engine(host, db_name, username, pwd, port)
+        for column in frame.columns[2:]:
+            if column in values and column not in filled:
+                values[column][from_pos, to_pos] = frame[column].values[on_grid]
+                filled.add(column)
 
-# Set schema
-Base.metadata.create_all(engine)
+    from_idx, to_idx = np.nonzero(coverage == len(frames))
+    data = {'from_id': from_ids[from_idx].astype(np.int64), 'to_id': to_ids[to_idx].astype(np.int64)}
+    for column in columns[2:]:
+        data[column] = values[column][from_idx, to_idx]
+    return pd.DataFrame(data, columns=columns)
+
+class BufferCellBitmap(object):
+    """Bitmap of the buffer cells over the YKR_ID range, so membership is one array lookup per ID."""
+
+    def __init__(self, buffer_ids):
+        buffer_ids = np.asarray(buffer_ids, dtype=np.int64)
+        self.offset = int(buffer_ids.min()) if len(buffer_ids) else 0
+        self.bitmap = np.zeros(int(buffer_ids.max()) - self.offset + 1 if len(buffer_ids) else 0, dtype=bool)
+        self.bitmap[buffer_ids - self.offset] = True
+
+    def contains(self, ids):
+        positions = np.asarray(ids, dtype=np.int64) - self.offset
+        inside = (positions >= 0) & (positions < len(self.bitmap))
+        result = np.zeros(len(positions), dtype=bool)
+        result[inside] = self.bitmap[positions[inside]]
+        return result
+
+def excludeBufferCellsAndZeroSelfPairs(data, buffer_cells):
+    """Drop the pairs starting or ending in a buffer cell and set every value of the from_id == to_id pairs to zero
+    (i.e. no movement), in one vectorized pass."""
+    from_ids = data['from_id'].values
+    to_ids = data['to_id'].values
+    data = data.loc[~(buffer_cells.contains(from_ids) | buffer_cells.contains(to_ids))].copy()
+
+    self_pairs = (data['from_id'].values == data['to_id'].values)
+    data.loc[self_pairs, data.columns[2:]] = 0
+    return data, int(self_pairs.sum())
+
+# --------------------
+# STAGING TABLES
+# --------------------
+
+def stagingTableName(matrix_id):
+    return "%s_staging_%s" % (DATA_TABLE, matrix_id)
+
+def tableColumns():
+    return ", ".join("%s %s" % (column, 'bigint' if column in ('from_id', 'to_id') else 'double precision')
+                     for column in output_cols)
+
+def createDataTable(engine):
+    """Create the data table once before the workers start, so they never race to create it."""
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE IF NOT EXISTS %s (%s)" % (DATA_TABLE, tableColumns())))
+
+def createStagingTable(engine, matrix_id):
+    """Empty UNLOGGED staging table of the input matrix, a left-over of an interrupted run is discarded."""
+    staging = stagingTableName(matrix_id)
+    with engine.begin() as connection:
+        connection.execute(text("DROP TABLE IF EXISTS %s" % staging))
+        connection.execute(text("CREATE UNLOGGED TABLE %s (%s)" % (staging, tableColumns())))
+
+def copyRows(engine, tableName, data, batch_size):
+    """Load the rows with COPY FROM STDIN in CSV batches of 'batch_size' rows."""
+    sql = "COPY %s (%s) FROM STDIN WITH (FORMAT csv)" % (tableName, ", ".join(data.columns))
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        for start in range(0, len(data), batch_size):
+            buffer = io.StringIO()
+            data.iloc[start:start + batch_size].to_csv(buffer, header=False, index=False)
+            buffer.seek(0)
+            cursor.copy_expert(sql, buffer)
+        connection.commit()
+    finally:
+        connection.close()
+
+def createMatrixIndexes(engine):
+    """Index 'from_id' and 'to_id' once every row is loaded, which is faster than maintaining them during COPY."""
+    with engine.begin() as connection:
+        connection.execute(text("CREATE INDEX IF NOT EXISTS fromididx ON %s (from_id)" % DATA_TABLE))
+        connection.execute(text("CREATE INDEX IF NOT EXISTS toididx ON %s (to_id)" % DATA_TABLE))
+
+def publishStagingTable(engine, matrix_id, from_ids, replace):
+    """Move the rows of the staging table into the data table in one transaction, so an interrupted run never leaves
+    partial rows behind. With 'replace' the rows of the origins written by an earlier run are deleted first; the data
+    table has no 'from_id' index while loading, so the delete is only done when the manifest says it is needed."""
+    staging = stagingTableName(matrix_id)
+    with engine.begin() as connection:
+        if replace:
+            connection.execute(text("DELETE FROM %s WHERE from_id = ANY(:ids)" % DATA_TABLE),
+                               {'ids': [int(from_id) for from_id in from_ids]})
+        connection.execute(text("INSERT INTO %s SELECT * FROM %s" % (DATA_TABLE, staging)))
+        connection.execute(text("DROP TABLE %s" % staging))
+
+# ============
+# PARAMETERS
+# ============
 
 # File paths
 extrafp = "data/BufferCells.txt"
@@ -103,18 +305,8 @@ car_r_dir = "data/car_rush_hour_2018"
 car_m_dir = "data/car_midday_2018"
 bike_f_dir = "data/bike_fast_2018"
 bike_s_dir = "data/bike_slow_2018"
-
-# Read input matrix filepaths
-pt_r_paths = filePathsToList(pt_r_dir, criteria='pt', fileformat='.txt')
-pt_m_paths = filePathsToList(pt_m_dir, criteria='pt', fileformat='.txt')
-Walkpaths = filePathsToList(walk_dir, criteria='walk', fileformat='.txt')
-car_r_paths = filePathsToList(car_r_dir, criteria='car', fileformat='.geojson')
-car_m_paths = filePathsToList(car_m_dir, criteria='car', fileformat='.geojson')
-bike_f_paths = filePathsToList(bike_f_dir, criteria='bike', fileformat='.geojson')
-bike_s_paths = filePathsToList(bike_s_dir, criteria='bike', fileformat='.geojson')
-
-# Read Extra grid cells
-extra = pd.read_csv(extrafp, sep='\t', usecols=['ID'])
+manifestfp = "compiler_manifest.json"
+reportfp = "compiler_input_report.json"
 
 # Necessary columns in raw data
 pt_cols = ['from_id', 'to_id', 'total_route_time', 'route_time', 'route_distance']
@@ -133,139 +325,216 @@ car_m_names = ['from_id', 'to_id', 'car_m_t', 'car_m_d']
 bike_f_names = ['from_id', 'to_id', 'bike_f_t', 'bike_d']
 bike_s_names = ['from_id', 'to_id', 'bike_s_t', 'bike_d']
 
+# Columns of the compiled travel time matrix
+output_cols = ['from_id', 'to_id', 'walk_t', 'walk_d', 'bike_f_t', 'bike_s_t', 'bike_d',
+               'pt_r_tt', 'pt_r_t', 'pt_r_d', 'pt_m_tt', 'pt_m_t', 'pt_m_d',
+               'car_r_t', 'car_r_d', 'car_m_t', 'car_m_d', 'car_sl_t']
+
+# Rows per COPY batch
+copy_batch_size = 1000000
+
 # Nodata value in MetropAccess-Reititin
 nodata_value = -99999.99
 
-# Start index (for reboot/parallel purposes)
-start_idx = 0
+def compileMatrix(inputs, buffer_cells, engine, matrix_id, replace, batch_size=copy_batch_size):
+    # ----------
+    # WALK
+    # ----------
+    # Process Walk data
+    print("Processing walk..")
+    walk = processMatrix(fp=inputs['walk'], columns=walk_cols, names=walk_m_names, nodata_value=nodata_value, columns_to_round=['total_route_time', 'route_distance'])
 
-# End index
-end_idx = 293
+    # -------------
+    # PT Rush hour
+    # -------------
+    print("Processing PT rush hour..")
+    pt_r = processMatrix(fp=inputs['pt_r'], columns=pt_cols, names=pt_r_names, nodata_value=nodata_value, columns_to_round=['total_route_time', 'route_time', 'route_distance'])
 
-# ---------------------------------------------------------------------------------------------
-# Iterate over input matrices and create MetropAccess-TravelTimeMatrix results files (unsorted)
-# ---------------------------------------------------------------------------------------------
-for fileidx, matrix_fp in enumerate(Walkpaths):
-    if fileidx >= start_idx and fileidx < end_idx:
-        print("---------------------------------\nIndex: %s\n" % fileidx, os.path.basename(matrix_fp), "\n"*2)
-        
-        # ----------
-        # WALK
-        # ----------
-        # Process Walk data
-        print("Processing walk..")
-        walk = processMatrix(fp=matrix_fp, columns=walk_cols, names=walk_m_names, nodata_value=nodata_value, columns_to_round=['total_route_time', 'route_distance'])
-            
-        # -------------
-        # PT Rush hour
-        # -------------
-        print("Processing PT rush hour..")
-        # Find corresponding PT rush hour data
-        pt_r_fp = findMatchingFile(matrix_fp, pt_r_paths)
-        # Process PT rush hour
-        pt_r = processMatrix(fp=pt_r_fp, columns=pt_cols, names=pt_r_names, nodata_value=nodata_value, columns_to_round=['total_route_time', 'route_time', 'route_distance'])
-        
-        # -------------
-        # PT Midday
-        # -------------
-        print("Processing PT midday..")    
-        # Find corresponding PT rush hour data
-        pt_m_fp = findMatchingFile(matrix_fp, pt_m_paths)
-        # Process PT midday 
-        pt_m = processMatrix(fp=pt_m_fp, columns=pt_cols, names=pt_m_names, nodata_value=nodata_value, columns_to_round=['total_route_time', 'route_time', 'route_distance'])
-
-        # ----------------------
-        # Car Rush hour
-        # ----------------------
-        print("Processing Car Rush hour..")        
-        # Read corresponding Car rush hour / midday data
-        car_r_fp = findMatchingFile(matrix_fp, car_r_paths, mode='car')
-        # Process Car Midday
-        car_r = process_dora(fp=car_r_fp, columns=car_r_cols, names=car_r_names, columns_to_round=['travel_time', 'distance'])
-
-        # ----------------------
-        # Car Midday
-        # ----------------------
-        print("Processing Car midday..")        
-        # Read corresponding Car rush hour / midday data
-        car_m_fp = findMatchingFile(matrix_fp, car_m_paths, mode='car')
-        # Process Car Midday
-        car_m = process_dora(fp=car_m_fp, columns=car_m_cols, names=car_m_names, columns_to_round=['travel_time', 'distance'])
-        
-        # ----------------------
-        # Bike Fast
-        # ----------------------
-        print("Processing Fast biker..")        
-        # Read corresponding data
-        bike_f_fp = findMatchingFile(matrix_fp, bike_f_paths, mode='bicycle')
-        # Process bike
-        bike_f = process_dora(fp=bike_f_fp, columns=bike_f_cols, names=bike_f_names, columns_to_round=['travel_time', 'distance'])
-        
-        # ----------------------
-        # Bike slow
-        # ----------------------
-        print("Processing Slow biker..")        
-        # Read corresponding data
-        bike_s_fp = findMatchingFile(matrix_fp, bike_s_paths, mode='bicycle')
-        # Process bike
-        bike_s = process_dora(fp=bike_s_fp, columns=bike_s_cols, names=bike_s_names, columns_to_round=['travel_time', 'distance'])
-
-        # --------------------------
-        # Create Travel Time Matrix
-        # --------------------------
-        print("Creating Travel Time Matrix..")    
-        # Join Datasets together
-        data = walk.merge(pt_r, on=['from_id', 'to_id'])
-        data = data.merge(pt_m, on=['from_id', 'to_id'])
-        data = data.merge(car_r, on=['from_id', 'to_id'])
-        data = data.merge(car_m, on=['from_id', 'to_id'])
-        data = data.merge(bike_f, on=['from_id', 'to_id'])
-        data = data.merge(bike_s, on=['from_id', 'to_id'])
-            
-        # Exclude rows that belongs to Extra grid
-        data = data.ix[~data['to_id'].isin(extra['ID'].values)]
-        data = data.ix[~data['from_id'].isin(extra['ID'].values)]
-        
-        # Ensure correct column order
-        data = data[['from_id', 'to_id', 'walk_t', 'walk_d', 'bike_f_t', 'bike_s_t', 'bike_d', 
-                     'pt_r_tt', 'pt_r_t', 'pt_r_d','pt_m_tt', 'pt_m_t', 'pt_m_d', 
-                     'car_r_t', 'car_r_d', 'car_m_t', 'car_m_d', 'car_sl_t']]
-
-        # Prepare zero values for rows where 'from_id' equals 'to_id' ==> I.e. no movement
-        # --------------------------------------------------------------------------------
-        # Number of columns
-        colLength = len(data.columns)
-        # The amount of zeros that will be inserted ==> all columns except 'from_id' and 'to_id' 
-        zeros_cnt = colLength-2
-        # Create a list with zeros
-        zeros = [0 for zero in range(zeros_cnt)]
+    # -------------
+    # PT Midday
+    # -------------
+    print("Processing PT midday..")
+    pt_m = processMatrix(fp=inputs['pt_m'], columns=pt_cols, names=pt_m_names, nodata_value=nodata_value, columns_to_round=['total_route_time', 'route_time', 'route_distance'])
+
+    # ----------------------
+    # Car Rush hour
+    # ----------------------
+    print("Processing Car Rush hour..")
+    car_r = process_dora(fp=inputs['car_r'], columns=car_r_cols, names=car_r_names, columns_to_round=['travel_time', 'distance'])
+
+    # ----------------------
+    # Car Midday
+    # ----------------------
+    print("Processing Car midday..")
+    car_m = process_dora(fp=inputs['car_m'], columns=car_m_cols, names=car_m_names, columns_to_round=['travel_time', 'distance'])
+
+    # ----------------------
+    # Bike Fast
+    # ----------------------
+    print("Processing Fast biker..")
+    bike_f = process_dora(fp=inputs['bike_f'], columns=bike_f_cols, names=bike_f_names, columns_to_round=['travel_time', 'distance'])
+
+    # ----------------------
+    # Bike slow
+    # ----------------------
+    print("Processing Slow biker..")
+    bike_s = process_dora(fp=inputs['bike_s'], columns=bike_s_cols, names=bike_s_names, columns_to_round=['travel_time', 'distance'])
+
+    # --------------------------
+    # Create Travel Time Matrix
+    # --------------------------
+    print("Creating Travel Time Matrix..")    
+    # Place the datasets on the same (from_id, to_id) grid, in the correct column order
+    data = alignModeMatrices([walk, pt_r, pt_m, car_r, car_m, bike_f, bike_s], output_cols)
         
-        # Save Files to disk
-        # ------------------
-        print("Saving Travel Time Matrix..")    
-
-        # Group by 'to_id'
-        grouped = data.groupby('to_id')
-
-        # Iterete over 'to_id' groups and save data to disk
-        for to_id, values in grouped:
-
-            # ---------------------------------------
-            # Set values to zero if from_id == to_id
-            # ---------------------------------------
-            if to_id in values['from_id'].values:
-                # Select value
-                fromID_equals_toID = values.ix[values['from_id'] == to_id]['from_id']
-                # Get index
-                fromID_equals_toID_idx = fromID_equals_toID.index
-                # Create zero-values list
-                zerovalues = [int(fromID_equals_toID), to_id] + zeros
-                # Insert the values in the DataFrame
-                values.ix[fromID_equals_toID_idx] = zerovalues
-                print("Replaced internal cell values for %s" % to_id)
-                
-            # --------------------------
-            # Write results to PostGIS
-            # --------------------------
-            values.to_sql(DATA_TABLE, engine, if_exists='append', index=False)
+    # Exclude rows that belongs to Extra grid and set values to zero if from_id == to_id
+    data, self_pairs = excludeBufferCellsAndZeroSelfPairs(data, buffer_cells)
+    print("Replaced internal cell values for %s cells" % self_pairs)
+
+    # Save Files to disk
+    # ------------------
+    print("Saving Travel Time Matrix..")    
+
+    # Rows of the same destination next to each other, then bulk load them into the staging table
+    data = data.sort_values('to_id', kind='stable')
+    createStagingTable(engine, matrix_id)
+    copyRows(engine, stagingTableName(matrix_id), data, batch_size)
+
+    publishStagingTable(engine, matrix_id, walk['from_id'].unique(), replace)
+
+# Engine and buffer cells of a worker process, created by its first task
+worker_state = {}
+
+def compileWorker(task):
+    """Compile one input matrix in a worker process, returns (matrix_id, error message or None)."""
+    matrix_id, inputs, replace, batch_size = task
+    try:
+        if not worker_state:
+            extra = pd.read_csv(extrafp, sep='\t', usecols=['ID'])
+            engine = create_DB_engine(IP_ADDRESS, POSTGIS_DB_NAME, POSTGIS_USERNAME, POSTGIS_PWD, POSTGIS_PORT)
+            worker_state.update(buffer_cells=BufferCellBitmap(extra['ID'].values), engine=engine)
+        print("---------------------------------\nCompiling %s (pid %s)\n" % (matrix_id, os.getpid()))
+        compileMatrix(inputs, worker_state['buffer_cells'], worker_state['engine'], matrix_id, replace, batch_size)
+    except Exception as e:
+        return matrix_id, "%s: %s" % (type(e).__name__, e)
+    return matrix_id, None
+
+def selectShard(paths, shard_index, shard_count):
+    """Every 'shard_count'th walk matrix starting from 'shard_index', e.g. the task of one array job."""
+    return sorted(paths)[shard_index::shard_count]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the MetropAccess-TravelTimeMatrix into PostGIS.")
+    parser.add_argument('--manifest', default=None,
+                        help="Checkpoint manifest, the input matrices already compiled with the same content are skipped.")
+    parser.add_argument('--jobs', type=int, default=1, help="Number of worker processes.")
+    parser.add_argument('--shard-index', type=int, default=0, help="Shard of this run (e.g. the array job index).")
+    parser.add_argument('--shard-count', type=int, default=1, help="Number of shards the walk matrices are split into.")
+    parser.add_argument('--copy-batch-size', type=int, default=copy_batch_size, help="Rows per COPY batch.")
+    parser.add_argument('--build-indexes', action='store_true',
+                        help="Index 'from_id' and 'to_id' of the data table after loading.")
+    args = parser.parse_args()
+
+    if not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard-index must be between 0 and --shard-count - 1")
+
+    # Each shard keeps its own manifest, so machines sharing the folder do not overwrite each other
+    manifest_fp = args.manifest
+    if manifest_fp is None:
+        manifest_fp = manifestfp if args.shard_count == 1 else \
+            manifestfp.replace('.json', '_%s_of_%s.json' % (args.shard_index, args.shard_count))
+
+    # Read input matrix filepaths
+    paths = {
+        'walk': filePathsToList(walk_dir, criteria='walk', fileformat='.txt'),
+        'pt_r': filePathsToList(pt_r_dir, criteria='pt', fileformat='.txt'),
+        'pt_m': filePathsToList(pt_m_dir, criteria='pt', fileformat='.txt'),
+        'car_r': filePathsToList(car_r_dir, criteria='car', fileformat='.geojson'),
+        'car_m': filePathsToList(car_m_dir, criteria='car', fileformat='.geojson'),
+        'bike_f': filePathsToList(bike_f_dir, criteria='bike', fileformat='.geojson'),
+        'bike_s': filePathsToList(bike_s_dir, criteria='bike', fileformat='.geojson'),
+    }
+
+    # Match the input matrices of every travel mode once, and report their coverage before compiling anything
+    indexes, report = buildInputIndex(paths)
+    with open(reportfp, 'w') as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+    print("Input matrices: %s walk, %s with missing modes, %s with duplicates, %s without walk matrix (see %s)"
+          % (len(paths['walk']), len(report['missing']), len(report['duplicates']), len(report['orphans']), reportfp))
+
+    Walkpaths = selectShard(paths['walk'], args.shard_index, args.shard_count)
+
+    # Matrices compiled by earlier runs
+    manifest = loadManifest(manifest_fp)
+
+    # ------------------------------------------------------------------
+    # Find the input matrices that are new, changed or were interrupted
+    # ------------------------------------------------------------------
+    tasks = []
+    for matrix_fp in Walkpaths:
+        matrix_id = inputFileID(matrix_fp, 'walk')
+        if matrix_fp != indexes['walk'].getFile(int(matrix_id)):
+            # Duplicate walk matrix of the same ID, compiled from the indexed one
+            continue
+
+        entry = manifest.get(matrix_id)
+        if matrix_id in report['missing']:
+            error = "Could not find the %s input matrices" % ", ".join(report['missing'][matrix_id])
+            print("Error: %s for %s" % (error, matrix_id))
+            manifest[matrix_id] = {'status': 'missing', 'error': error}
+            continue
+
+        inputs = matrixInputs(indexes, matrix_id)
+
+        signatures = inputSignatures(inputs, entry)
+        if isCompleted(entry, signatures):
+            print("Skipping %s, already compiled from the same inputs" % matrix_id)
+            continue
+
+        # A run that was started or completed earlier may have published rows of the same origins already
+        replace = entry is not None and entry.get('status') in ('started', 'completed')
+
+        manifest[matrix_id] = {'status': 'started', 'inputs': signatures}
+        tasks.append((matrix_id, inputs, replace, args.copy_batch_size))
+
+    saveManifest(manifest, manifest_fp)
+    if tasks:
+        createDataTable(create_DB_engine(IP_ADDRESS, POSTGIS_DB_NAME, POSTGIS_USERNAME, POSTGIS_PWD, POSTGIS_PORT))
+    print("Shard %s/%s: compiling %s of %s input matrices with %s workers"
+          % (args.shard_index, args.shard_count, len(tasks), len(Walkpaths), args.jobs))
+
+    # ---------------------------------------------------------------------------------------------
+    # Create MetropAccess-TravelTimeMatrix results (unsorted), each matrix in its own staging table
+    # ---------------------------------------------------------------------------------------------
+    if args.jobs > 1:
+        pool = multiprocessing.Pool(processes=args.jobs)
+        results = pool.imap_unordered(compileWorker, tasks)
+    else:
+        pool = None
+        results = map(compileWorker, tasks)
+
+    try:
+        for matrix_id, error in results:
+            if error is None:
+                manifest[matrix_id]['status'] = 'completed'
+            else:
+                print("Error: %s was not compiled: %s" % (matrix_id, error))
+                manifest[matrix_id]['status'] = 'failed'
+                manifest[matrix_id]['error'] = error
+            saveManifest(manifest, manifest_fp)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if args.build_indexes:
+        print("Building indexes..")
+        createMatrixIndexes(create_DB_engine(IP_ADDRESS, POSTGIS_DB_NAME, POSTGIS_USERNAME, POSTGIS_PWD, POSTGIS_PORT))
+
+    for status in ('missing', 'failed'):
+        ids = sorted(matrix_id for matrix_id, entry in manifest.items() if entry.get('status') == status)
+        if ids:
+            print("Input matrices %s: %s" % (status, ", ".join(ids)))
 
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,10 @@
 import psycopg2
-import pandas as pd
+import numpy as np
 import geopandas as gpd
 import os
+import argparse
+import collections
+import multiprocessing
 from base import POSTGIS_DB_NAME, IP_ADDRESS, POSTGIS_PORT, POSTGIS_USERNAME, POSTGIS_PWD, DATA_TABLE
 
 def connect_to_DB(host, db_name, username, pwd, port):
@@ -13,10 +16,10 @@ def connect_to_DB(host, db_name, username, pwd, port):
 
 def createMatrixIndexes(cursor, conn):
     # Create Index for 'to_id' and 'from_id'
-    sql = "CREATE INDEX fromididx ON %s (from_id)" % DATA_TABLE
+    sql = "CREATE INDEX IF NOT EXISTS fromididx ON %s (from_id)" % DATA_TABLE
     cursor.execute(sql)
     conn.commit()
-    sql = "CREATE INDEX toididx ON %s (to_id)" % DATA_TABLE
+    sql = "CREATE INDEX IF NOT EXISTS toididx ON %s (to_id)" % DATA_TABLE
     cursor.execute(sql)
     conn.commit()
 
@@ -24,72 +27,169 @@ def createMatrixFolder(outDir, to_id):
     dirname = "%sxxx" % str(to_id)[:4]
     fullpath = os.path.join(outDir, dirname)
     if not os.path.isdir(fullpath):
-        os.makedirs(fullpath)
+        # Writer processes may create the same folder at the same time
+        os.makedirs(fullpath, exist_ok=True)
     return fullpath
 
-    
+class GridFiller(object):
+    """Place the rows of one destination on the YKR grid, sorted by YKR_ID like the outer join used to do.
+
+    Origins without travel times are filled with -1 (also their 'to_id', as the outer join used to do), and origins
+    outside the grid are dropped."""
+
+    def __init__(self, grid_ids, columns):
+        # Each grid cell once, like the drop_duplicates on YKR_ID
+        self.sorted_ids = np.unique(np.asarray(grid_ids, dtype=np.int64))
+        self.columns = columns
+
+    def contains(self, ykr_id):
+        position = np.searchsorted(self.sorted_ids, ykr_id)
+        return position < len(self.sorted_ids) and self.sorted_ids[position] == ykr_id
+
+    def fill(self, rows):
+        """rows: array of (from_id, to_id, values...) sorted by from_id. Returns the (grid size, columns) array."""
+        filled = np.full((len(self.sorted_ids), len(self.columns)), -1, dtype=np.float64)
+        filled[:, 0] = self.sorted_ids
+        if len(rows) == 0 or len(self.sorted_ids) == 0:
+            return filled
+
+        # Keep the first row of each origin, like drop_duplicates did
+        from_ids, first = np.unique(rows[:, 0].astype(np.int64), return_index=True)
+        rows = rows[first]
+
+        positions = np.searchsorted(self.sorted_ids, from_ids).clip(max=len(self.sorted_ids) - 1)
+        in_grid = self.sorted_ids[positions] == from_ids
+        filled[positions[in_grid], 1:] = rows[in_grid, 1:]
+        return filled
+
+def formatMatrixBlock(block, columns):
+    """Text of a matrix file from an integer array, the integers are converted to text by numpy in one go."""
+    lines = [';'.join(columns)]
+    lines.extend(map(';'.join, np.asarray(block, dtype=np.int64).astype(str)))
+    return '\n'.join(lines) + '\n'
+
+def writeMatrixFile(outDir, to_id, block, columns):
+    # Create folder if does not exist
+    targetDir = createMatrixFolder(outDir, to_id)
+    # Outputpath
+    outfile = os.path.join(targetDir, "travel_times_to_%s.txt" % to_id)
+    # Write results to disk
+    with open(outfile, 'w') as f:
+        f.write(formatMatrixBlock(block, columns))
+    return to_id
+
+class MatrixFileWriter(object):
+    """Write the destination blocks with a pool of processes.
+
+    At most 'queue_size' blocks wait for a worker, when the queue is full 'write' blocks until the oldest one has been
+    written, so the database scan never gets far ahead of the disk."""
+
+    def __init__(self, outDir, columns, jobs=1, queue_size=64):
+        self.outDir = outDir
+        self.columns = columns
+        self.pool = multiprocessing.Pool(processes=jobs) if jobs > 1 else None
+        self.queue_size = queue_size
+        self.pending = collections.deque()
+
+    def write(self, to_id, filled):
+        # Round half to even like the '%.0f' format used to, and send integers to the worker
+        block = np.rint(filled).astype(np.int32)
+        if self.pool is None:
+            writeMatrixFile(self.outDir, to_id, block, self.columns)
+            return
+        while len(self.pending) >= self.queue_size:
+            self.pending.popleft().get()
+        self.pending.append(self.pool.apply_async(writeMatrixFile, (self.outDir, to_id, block, self.columns)))
+
+    def close(self):
+        while self.pending:
+            self.pending.popleft().get()
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+
+def iterDestinations(conn, src_table, columns, itersize):
+    """Scan the table once ordered by (to_id, from_id) with a server-side cursor and yield (to_id, rows) for every
+    destination as soon as its last row has been read."""
+    cursor = conn.cursor(name='matrix_export')
+    cursor.itersize = itersize
+    cursor.execute("SELECT %s FROM %s ORDER BY to_id, from_id" % (", ".join(columns), src_table))
+
+    pending = []
+    while True:
+        batch = cursor.fetchmany(itersize)
+        if not batch:
+            break
+        rows = np.array(batch, dtype=np.float64)
+        rows[np.isnan(rows)] = -1
+
+        # Split the batch where 'to_id' changes, the last group may continue in the next batch
+        bounds = np.flatnonzero(np.diff(rows[:, 1])) + 1
+        groups = np.split(rows, bounds)
+        for group in groups[:-1]:
+            pending.append(group)
+            yield int(pending[0][0, 1]), np.concatenate(pending)
+            pending = []
+        pending.append(groups[-1])
+
+    if pending:
+        yield int(pending[0][0, 1]), np.concatenate(pending)
+    cursor.close()
+
+# Output columns of the text files
+datacols = ['from_id', 'to_id', 'walk_t', 'walk_d', 'bike_f_t', 'bike_s_t', 'bike_d', 'pt_r_tt', 'pt_r_t', 'pt_r_d', 'pt_m_tt', 'pt_m_t',
+            'pt_m_d', 'car_r_t', 'car_r_d', 'car_m_t', 'car_m_d', 'car_sl_t']
+
+# Rows fetched at a time from the server-side cursor
+fetch_size = 200000
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the text-file version of the Helsinki Region Travel Time Matrix.")
+    parser.add_argument('--jobs', type=int, default=1, help="Number of writer processes.")
+    parser.add_argument('--queue-size', type=int, default=64, help="Destination blocks waiting for a writer at most.")
+    args = parser.parse_args()
+
+    # PostGIS Authentication crecedentials
+    db_name, host, port, username, pwd = POSTGIS_DB_NAME, IP_ADDRESS, POSTGIS_PORT, POSTGIS_USERNAME, POSTGIS_PWD
+
+    # Create connection to Database
+    conn, cursor = connect_to_DB(host, db_name, username, pwd, port)
+
+    # File paths
+    ykr_fp = "data/MetropAccess_YKR_grid_EurefFIN.shp"
+    outDir = "HelsinkiRegionTravelTimeMatrix2018"
+    src_table = "travel_time_matrix_2018"
+
+    # Read YKR_grid
+    ykr = gpd.read_file(ykr_fp)
+    grid_ids = ykr['YKR_ID'].values
+    gridFiller = GridFiller(grid_ids, datacols)
+
+    # --------------------------
+    # PARSE RESULTS
+    # --------------------------
 
-# PostGIS Authentication crecedentials
-db_name, host, port, username, pwd = POSTGIS_DB_NAME, IP_ADDRESS, POSTGIS_PORT, POSTGIS_USERNAME, POSTGIS_PWD
-
-# Create connection to Database
-conn, cursor = connect_to_DB(host, db_name, username, pwd, port)
-
-# File paths
-ykr_fp = "data/MetropAccess_YKR_grid_EurefFIN.shp"
-outDir = "HelsinkiRegionTravelTimeMatrix2018"
-src_table = "travel_time_matrix_2018"
-
-# Read YKR_grid
-ykr = gpd.read_file(ykr_fp)
-
-# --------------------------
-# PARSE RESULTS
-# --------------------------
-
-# Start & end index for processing (useful if needed to restart processing for some reason)
-start_idx = 0
-end_idx = 13231
-
-# Create Index for 'to_id' and 'from_id'
-createMatrixIndexes(cursor, conn)
-
-# Iterate over individual YKR_IDs and create
-for index, row in ykr.iterrows():
-    if index >= start_idx and index < end_idx:
-        # Get to_id
-        to_id = row['YKR_ID']
-        print("Processing ID: %s" % to_id) 
-
-        # Get unique 'to_id' values from the db
-        sql = """SELECT * FROM %s
-                   WHERE to_id = %s;""" % (src_table, to_id)
-
-        # Read data into DataFrame
-        data = pd.read_sql_query(sql, conn)
-
-        # Join ('outer') with YKR_ID to find out missing values and sort the values
-        data = ykr[['YKR_ID']].merge(data, left_on='YKR_ID', right_on='from_id', how='outer')
-
-        # Drop dublicate values
-        data = data.drop_duplicates(subset='YKR_ID')
-
-        # Set 'YKR_ID' value for 'from_id'
-        data['from_id'] = data['YKR_ID']
-
-        # Fill NaN values with -1
-        data = data.fillna(value=-1)
-
-        # Select output data
-        datacols = ['from_id', 'to_id', 'walk_t', 'walk_d', 'bike_f_t', 'bike_s_t', 'bike_d', 'pt_r_tt', 'pt_r_t', 'pt_r_d', 'pt_m_tt', 'pt_m_t',
-                    'pt_m_d', 'car_r_t', 'car_r_d', 'car_m_t', 'car_m_d', 'car_sl_t']
-        data = data[datacols]
-
-        # Create folder if does not exist
-        targetDir = createMatrixFolder(outDir, to_id)
-        # Create filename
-        outname = "travel_times_to_%s.txt" % to_id
-        # Outputpath
-        outfile = os.path.join(targetDir, outname)
-        # Write results to disk
-        data.to_csv(outfile, sep=';', index=False, mode='w', float_format="%.0f")
+    # Create Index for 'to_id' and 'from_id'
+    createMatrixIndexes(cursor, conn)
+
+    # Write the file of each destination of the grid as soon as its rows have been read
+    writer = MatrixFileWriter(outDir, datacols, jobs=args.jobs, queue_size=args.queue_size)
+    written = set()
+    try:
+        for to_id, rows in iterDestinations(conn, src_table, datacols, fetch_size):
+            if not gridFiller.contains(to_id):
+                continue
+            print("Processing ID: %s" % to_id)
+            writer.write(to_id, gridFiller.fill(rows))
+            written.add(to_id)
+
+        # Destinations without any travel time
+        for to_id in grid_ids:
+            if int(to_id) not in written:
+                print("Processing ID: %s (no data)" % to_id)
+                writer.write(int(to_id), gridFiller.fill(np.empty((0, len(datacols)))))
+    finally:
+        writer.close()
+
+if __name__ == '__main__':
+    main()
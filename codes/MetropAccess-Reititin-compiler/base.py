@@ -0,0 +1,11 @@
+# ============
+# PARAMETERS
+# ============
+# Shared by the compiler and the parser of the Helsinki Region Travel Time Matrix
+
+POSTGIS_DB_NAME='matrix'
+IP_ADDRESS='xx.xx.xx.xx'
+POSTGIS_PORT=5432
+POSTGIS_USERNAME='myusername'
+POSTGIS_PWD='mypwd'
+DATA_TABLE='travel_time_matrix_2018'
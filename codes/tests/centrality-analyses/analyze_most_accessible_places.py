@@ -1,58 +1,69 @@
 # -*- coding: utf-8 -*-
 """
-Analyze the most accessible areas with PT and Car. 
+Analyze the most accessible areas with PT and Car.
 
 
 Created on Wed Jun 13 13:38:04 2018
 
 @author: hentenka
 """
-import pandas as pd
-import geopandas as gpd
-from glob import glob
 import os
 
+import geopandas as gpd
+# DORA-matrix-compiler importable as 'codes' (as when running 'python -m codes')
+from codes.src.matrixStore.AccessibilitySummary import summarizeTravelTimeMatrixStore, \
+    summarizeTravelTimeMatrixFiles, joinSummaryToGrid
+from codes.src.matrixStore.TravelTimeMatrixStore import TravelTimeMatrixStore
+from codes.src.matrixStore.YKRIndex import YKRIndex
+
 # Filepaths
 matrix_dir = r"C:\HY-Data\HENTENKA\Data\HelsinkiTravelTimeMatrix2018_2"
-files = glob(os.path.join(matrix_dir, '*', 'travel*.txt'), recursive=True)
+# Store compiled with 'python -m codes --compileStore', the text files are read when it does not exist
+store_dir = r"C:\HY-Data\HENTENKA\Data\HelsinkiTravelTimeMatrix2018_store"
 ykr_fp = r"C:\HY-Data\HENTENKA\Data\MetropAccess_YKR_grid\MetropAccess_YKR_grid_EurefFIN.shp"
+summary_fp = r"C:\HY-Data\HENTENKA\KOODIT\HelsinkiRegionMatrix2018\data\Accessibility_summary_2018.gpkg"
 outfp = r"C:\HY-Data\HENTENKA\KOODIT\HelsinkiRegionMatrix2018\data\Most_accessible_places_2018.shp"
 
-# Read grid
-ykr = gpd.read_file(ykr_fp)
-
-# DataFrame for the results
-results = pd.DataFrame()
-
-# Iterate over files and calculate median
-for idx, fp in enumerate(files):
-    print(idx)
-    # Read file
-    data = pd.read_csv(fp, sep=';', na_values=[-1])
-    
-    # To id
-    to_id = data.head(1)['to_id'].values[0]
-    
-    # Calculate the median value for different travel modes
-    # PT
-    median_r_pt = data['pt_r_t'].median()
-    median_m_pt = data['pt_m_t'].median()
-    # Car
-    median_r_car = data['car_r_t'].median()
-    median_m_car = data['car_m_t'].median()
-    # Bike
-    median_f_bike = data['bike_f_t'].median()
-    median_s_bike = data['bike_s_t'].median()
-    
-    # Add to results
-    results = results.append([[to_id, median_m_pt, median_r_pt, median_m_car, median_r_car, median_f_bike, median_s_bike]], ignore_index=True)
-    
-# Add column names
-results.columns = ['to_id', 'ptrmedian', 'ptmmedian', 'carrmedian', 'carmmedian', 'bikfmedian', 'biksmedian']
-
-# Join
-join = ykr.merge(results, left_on='YKR_ID', right_on='to_id')
-
-# Save to file
-join.to_file(outfp)
+# Median travel times of the shapefile read by 'parse_best_10_percent_accessible_places.py'
+# (shapefile field names are limited to 10 characters)
+median_cols = {
+    'to_pt_r_t_median': 'ptrmedian',
+    'to_pt_m_t_median': 'ptmmedian',
+    'to_car_r_t_median': 'carrmedian',
+    'to_car_m_t_median': 'carmmedian',
+    'to_bike_f_t_median': 'bikfmedian',
+    'to_bike_s_t_median': 'biksmedian'
+}
+
+
+def main():
+    # Read grid
+    ykr = gpd.read_file(ykr_fp)
+
+    if os.path.isdir(store_dir):
+        # Statistics of every destination and origin, reduced block by block from the memory-mapped columns
+        store = TravelTimeMatrixStore(store_dir)
+        to_summary = summarizeTravelTimeMatrixStore(store, by="to_id")
+        from_summary = summarizeTravelTimeMatrixStore(store, by="from_id")
+    else:
+        # Statistics of every destination, one matrix file per worker process
+        ykr_index = YKRIndex.build(ykrIds=ykr['YKR_ID'].values, matrixFolder=matrix_dir)
+        files = ykr_index.getFiles(ykr['YKR_ID'].values)
+        to_summary = summarizeTravelTimeMatrixFiles(files)
+        from_summary = None
+
+    # Join
+    join = joinSummaryToGrid(ykr, to_summary, gridID='YKR_ID', prefix='to_')
+    if from_summary is not None:
+        join = joinSummaryToGrid(join, from_summary, gridID='YKR_ID', prefix='from_')
+
+    # Save to file
+    join.to_file(summary_fp, driver="GPKG")
+
+    # Cells with a matrix file, with the median travel times of each mode
+    places = join.loc[join['to_pt_r_t_count'].notna(), list(ykr.columns) + list(median_cols)]
+    places.rename(columns=median_cols).to_file(outfp)
+
 
+if __name__ == '__main__':
+    main()